@@ -1,46 +1,88 @@
 import customtkinter as ctk
 import tkinter as tk
 import tkintermapview as tkmap
-import importlib
 import ebird.api as ebird
 import webbrowser
 import birdtool
-import copy
+import io
+from PIL import Image, ImageTk
 from dotenv import load_dotenv, dotenv_values
 import datetime
 import time
-import threading
+import traceback
 import json
 import os
 
-# Import the geocoder osm file
-geocoder_osm = importlib.import_module('geocoder.osm')
-
-# This is for patching a problem in the geocoder osm script causing nominatim servers to reject requests
-def _build_headers(self, provider_key, **kwargs):
-        """Will be overridden according to the targetted web service"""
-        return {"User-Agent": 'My User Agent 1.0'}
-
-# monkey patching babyyy
-geocoder_osm.OsmQuery._build_headers = _build_headers
-
 load_dotenv('ebird_key.env')
 api_key = os.getenv('EBIRD_ACCESS')
+# Comma separated eBird region codes to show hotspots for, e.g. 'US-VA,US-MD'
+regions = [region.strip() for region in os.getenv('EBIRD_REGIONS', 'US-VA').split(',') if region.strip()]
 
 ctk.set_appearance_mode('dark')
 ctk.set_default_color_theme('dark-blue')
 
+# Map widget that loads tiles through birdtool's disk cache, so visited and prefetched areas draw without the network
+class cachedMapView(tkmap.TkinterMapView):
+    def request_image(self, zoom, x, y, db_cursor=None):
+
+        '''Returns a tile image from the tile cache, or an empty tile if it isn't cached and can't be downloaded'''
+
+        try:
+            data = birdtool.get_tile_cache().tile(self.tile_server, zoom, x, y)
+        except Exception:
+            # A cache error leaves an empty tile rather than ending the map's tile loading thread
+            return self.empty_tile_image
+        if data is None or not self.running:
+            # Left out of the memory cache so the tile is requested again once the network is back
+            return self.empty_tile_image
+
+        try:
+            image_tk = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+        except Exception:
+            return self.empty_tile_image
+        self.tile_image_cache[f"{zoom}{x}{y}"] = image_tk
+        return image_tk
+
 # Frame template for displaying observation data 
 class birdFrame(ctk.CTkFrame):
-    def __init__(self, parent, data):
+    def __init__(self, parent, data=None):
         super().__init__(parent)
 
-        self.observation_data = data
-        # Creating a link to the eBird page for the current species
-        self.bird_link = f"https://ebird.org/species/{self.observation_data['species_code']}/"
+        self.observation_data = None
+        self.name = ''
 
         self.grid_rowconfigure((0,3), weight=1)
         self.grid_columnconfigure(0, weight=1)
+        
+        self._border_width = 2
+
+        self.nameLabel = ctk.CTkLabel(self, text=self.name, text_color='White', font=('Arial', 18, 'bold'), anchor='center')
+        self.nameLabel.grid(row=0, column=0, padx=5, pady=10, sticky='nsew')
+
+        # Bind events to the nameLabel widget; allows user to access eBird species page on click
+        self.nameLabel.bind('<Button-1>', self.open_bird_page)
+        self.nameLabel.bind('<Enter>', self.hover_enter)
+        self.nameLabel.bind('<Leave>', self.hover_leave)
+
+        self.dateLabel = ctk.CTkLabel(self, text='', font=('Arial', 16), anchor='center')
+        self.dateLabel.grid(row=1, column=0, padx=5, pady=(0,5), sticky='nsew')
+
+        self.numLabel = ctk.CTkLabel(self, text='', font=('Arial', 16), anchor='center')
+        self.numLabel.grid(row=2, column=0, padx=5, pady=5, sticky='nsew')
+
+        self.countLabel = ctk.CTkLabel(self, text='', font=('Arial', 16), anchor='center')
+        self.countLabel.grid(row=3, column=0, padx=5, pady=(5,10), sticky='nsew')
+
+        if data is not None:
+            self.set_data(data)
+
+    def set_data(self, data):
+
+        '''Binds the frame to an observation record and updates its labels'''
+
+        self.observation_data = data
+        # Creating a link to the eBird page for the current species
+        self.bird_link = f"https://ebird.org/species/{self.observation_data['species_code']}/"
 
         self.name = self.observation_data['common_name']
         self.time_since = self.observation_data['time_since']
@@ -65,25 +107,11 @@ class birdFrame(ctk.CTkFrame):
             self.countstr = f"Counted in {self.count} unique checklists"
         else:
             self.countstr = f"Counted in 1 unique checklist"
-        
-        self._border_width = 2
-
-        self.nameLabel = ctk.CTkLabel(self, text=self.name, text_color='White', font=('Arial', 18, 'bold'), anchor='center')
-        self.nameLabel.grid(row=0, column=0, padx=5, pady=10, sticky='nsew')
-
-        # Bind events to the nameLabel widget; allows user to access eBird species page on click
-        self.nameLabel.bind('<Button-1>', self.open_bird_page)
-        self.nameLabel.bind('<Enter>', self.hover_enter)
-        self.nameLabel.bind('<Leave>', self.hover_leave)
-
-        self.dateLabel = ctk.CTkLabel(self, text=self.last_seen, font=('Arial', 16), anchor='center')
-        self.dateLabel.grid(row=1, column=0, padx=5, pady=(0,5), sticky='nsew')
-
-        self.numLabel = ctk.CTkLabel(self, text=self.num_seen, font=('Arial', 16), anchor='center')
-        self.numLabel.grid(row=2, column=0, padx=5, pady=5, sticky='nsew')
 
-        self.countLabel = ctk.CTkLabel(self, text=self.countstr, font=('Arial', 16), anchor='center')
-        self.countLabel.grid(row=3, column=0, padx=5, pady=(5,10), sticky='nsew')
+        self.nameLabel.configure(text=self.name, text_color='White', font=('Arial', 18, 'bold'))
+        self.dateLabel.configure(text=self.last_seen)
+        self.numLabel.configure(text=self.num_seen)
+        self.countLabel.configure(text=self.countstr)
     
     # Opens a page in the default browser
     def open_bird_page(self, event):
@@ -95,23 +123,149 @@ class birdFrame(ctk.CTkFrame):
     def hover_leave(self, event):
         self.nameLabel.configure(text=self.name, text_color = 'White', font=('Arial', 18, 'bold'))
 
+# Scrolling list for observation data; only holds enough birdFrame rows to fill its height
+class birdList(ctk.CTkFrame):
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        # Observation records, and the indexes of the records currently shown in the list
+        self.records = []
+        self.visible = []
+        self.first = 0
+        self.rows = []
+        self.row_height = None
+        self.page_size = 1
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        # Rows past the bottom edge are clipped instead of growing the frame
+        self.row_frame = ctk.CTkFrame(self, fg_color='transparent')
+        self.row_frame.grid(row=0, column=0, sticky='nsew')
+        self.row_frame.grid_columnconfigure(0, weight=1)
+        self.row_frame.grid_propagate(False)
+        self.row_frame.bind('<Configure>', self.resize)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.scroll)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+
+        # Windows and macOS send MouseWheel events; X11 sends button 4 and 5 presses
+        self.bind_all('<MouseWheel>', self.mouse_wheel, add='+')
+        self.bind_all('<Button-4>', self.mouse_wheel, add='+')
+        self.bind_all('<Button-5>', self.mouse_wheel, add='+')
+
+    def resize(self, event):
+
+        '''Grows or shrinks the pool of rows to match the height of the list'''
+
+        # Measures a blank row once; every row has the same layout
+        if self.row_height is None:
+            probe = birdFrame(self.row_frame)
+            probe.grid(row=0, column=0, padx=5, pady=5, sticky='nsew')
+            probe.update_idletasks()
+            self.row_height = probe.winfo_reqheight() + 10
+            self.rows.append(probe)
+
+        self.page_size = max(1, event.height // self.row_height)
+        # One extra row fills the partial space under the last full row
+        while len(self.rows) < self.page_size + 1:
+            self.rows.append(birdFrame(self.row_frame))
+        while len(self.rows) > self.page_size + 1:
+            self.rows.pop().destroy()
+
+        self.render()
+
+    def set_records(self, records, indexes=None, keep_position: bool = False):
+
+        '''Replaces the records shown by the list, optionally limited to the given indexes \n
+        Scrolls back to the top unless keep_position is set'''
+
+        self.records = records
+        self.set_visible(range(len(records)) if indexes is None else indexes, keep_position)
+
+    def set_visible(self, indexes, keep_position: bool = False):
+
+        '''Limits the list to records at the given indexes and scrolls back to the top unless keep_position is set'''
+
+        self.visible = list(indexes)
+        if not keep_position:
+            self.first = 0
+        self.render()
+
+    def scroll(self, action, amount, unit=None):
+
+        '''Scrollbar command; moves the first shown record by row, by page or to a fraction of the list'''
+
+        if action == 'moveto':
+            self.first = int(float(amount) * len(self.visible))
+        elif unit == 'pages':
+            self.first += int(amount) * self.page_size
+        else:
+            self.first += int(amount)
+        self.render()
+
+    def mouse_wheel(self, event):
+
+        '''Scrolls the list by one row per wheel step while the pointer is over it'''
+
+        # The scrollbar handles wheel events over itself
+        widget = str(event.widget)
+        if not widget.startswith(str(self)) or widget.startswith(str(self.scrollbar)):
+            return
+        if event.num == 4 or event.delta > 0:
+            self.scroll('scroll', -1)
+        else:
+            self.scroll('scroll', 1)
+
+    def render(self):
+
+        '''Rebinds the pooled rows to the records starting at the current scroll position'''
+
+        with birdtool.profiler.span('render_rows'):
+            self.bind_rows()
+
+    def bind_rows(self):
+
+        '''Binds each pooled row to its record and updates the scrollbar; called by render'''
+
+        self.first = max(0, min(self.first, len(self.visible) - self.page_size))
+
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if index < len(self.visible):
+                record = self.records[self.visible[index]]
+                # Relabeling is skipped when a row already shows this record
+                if row.observation_data is not record:
+                    row.set_data(record)
+                row.grid(row=i, column=0, padx=5, pady=5, sticky='nsew')
+            else:
+                row.grid_remove()
+
+        if self.visible:
+            self.scrollbar.set(self.first / len(self.visible), min(1, (self.first + self.page_size) / len(self.visible)))
+        else:
+            self.scrollbar.set(0, 1)
+
 # Frame for storing the map widget and related widgets
 class mapFrame(ctk.CTkFrame):
     def __init__(self, parent):
         super().__init__(parent)
 
         # Control values for handling functions
-        self.thread_lock = threading.Lock()
-        self.command_lock = False
-        self.last_zoom = None
+        self.scheduler = parent.scheduler
+        self.last_view = None
         
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=10)
 
+        # Warms observation data for hotspots in view in the background
+        self.prefetcher = birdtool.HotspotPrefetcher(api_key)
+        self.prefetcher.start()
+
         # Initializing the map
         self.base_map()
-        self.marker_attributes = self.create_markers(parent)
+        self.hotspot_index = self.index_hotspots(parent)
         self.zoom_polling()
 
         # Lets the user change map location by typing an address
@@ -123,94 +277,227 @@ class mapFrame(ctk.CTkFrame):
 
         '''Creates a map instance and sets default values'''
 
-        self.map = tkmap.TkinterMapView(self)
-        self.map.set_tile_server("https://mt0.google.com/vt/lyrs=m&hl=en&x={x}&y={y}&z={z}&s=Ga", max_zoom=22)
-        self.map.set_address('Charlottesville, Virginia, USA')
-        self.map.set_zoom(15)
+        self.map = cachedMapView(self)
+        self.map.set_tile_server(birdtool.tile_server, max_zoom=22)
         self.map.grid(row=1, column=0, columnspan=5, padx=0, pady=0, sticky='nsew')
+        self.find_address('Charlottesville, Virginia, USA', zoom=15)
         return(self.map)
 
     def change_address(self, event):
         '''Changes the currently displayed map address'''
         new_address = self.address.get()
-        self.map.set_address(new_address)
-
-    def create_markers(self, parent):
-
-        '''Initializes marker objects for all cached hotspots and draws them onto the map widget'''
-
-        marker_attrlist = []
-        for spot in parent.hotspots:
-            pos = (spot.get('lat'), spot.get('lng'))
-            name = spot.get('locName')
-            id = spot.get('locId')
-            days_back = 14
-            locMarker = self.map.set_marker(pos[0], pos[1], text=name)
-            locMarker.data = birdtool.BirdDataHandler(api_key, id, days_back)
-            locMarker.command = lambda m=locMarker: threading.Thread(target=self.observation_unpacker, args=(m,)).start()
-
-            # Store marker attributes to reinitialize later
-            marker_attrlist.append({
-                'pos': (pos),
-                'name': name,
-                'data': copy.copy(locMarker.data),
-                'command': locMarker.command
-                })
-            
-        return(marker_attrlist)
-
-    # Updates marker visibility based on map zoom to avoid clutter
+        self.find_address(new_address)
+
+    def find_address(self, address, zoom=None):
+
+        '''Moves the map to an address, geocoding it off the Tk thread when it isn't known locally \n
+        Cached addresses and hotspot names move the map immediately'''
+
+        geocoder = birdtool.get_geocoder()
+
+        place = geocoder.local(address)
+        if place is not None:
+            # A lookup still in progress would otherwise move the map afterwards
+            self.scheduler.supersede('address')
+            self.show_place(place, zoom)
+            return
+
+        # A newer search supersedes this one, dropping its result
+        def lookup(job):
+            job.post(self.show_place, geocoder.lookup(address), zoom)
+
+        self.scheduler.submit('address', lookup)
+
+    def show_place(self, place, zoom=None):
+
+        '''Centers the map on a geocoded place, zoomed to fit its bounding box unless a zoom is given'''
+
+        if place is None:
+            return
+
+        if zoom is None:
+            zoom = 15
+            if place['bbox'] is not None:
+                south, west, north, east = place['bbox']
+                # Steps out from street level until the whole box fits in the map
+                for zoom in range(17, 0, -1):
+                    left, top = birdtool.mercator_pixels(north, west, zoom)
+                    right, bottom = birdtool.mercator_pixels(south, east, zoom)
+                    if right - left <= self.map.winfo_width() and bottom - top <= self.map.winfo_height():
+                        break
+
+        self.map.set_position(place['lat'], place['lng'])
+        self.map.set_zoom(zoom)
+
+    def index_hotspots(self, parent):
+
+        '''Builds a spatial index over all cached hotspots \n
+        Markers are only drawn for hotspots inside the current view'''
+
+        # Handlers are kept per hotspot so observation data survives a marker leaving the view
+        self.handlers = {}
+        self.visible_markers = {}
+        self.visible_clusters = {}
+        self.cluster_index = parent.clusters
+        return(birdtool.HotspotGrid(parent.hotspots))
+
+    def reload_hotspots(self, parent):
+
+        '''Rebuilds the spatial indexes from the parent's hotspots and clusters and redraws the markers in view'''
+
+        self.hotspot_index = birdtool.HotspotGrid(parent.hotspots)
+        self.cluster_index = parent.clusters
+        self.sync_markers(self.visible_markers, {}, self.draw_marker)
+        self.sync_markers(self.visible_clusters, {}, self.draw_cluster)
+        self.map.canvas.configure(cursor='')
+        self.update_markers(self.map.zoom)
+
+    def draw_marker(self, spot):
+
+        '''Draws a marker for a hotspot and attaches its data handler and click command'''
+
+        id = spot.get('locId')
+        days_back = 14
+        if id not in self.handlers:
+            self.handlers[id] = birdtool.BirdDataHandler(api_key, id, days_back, incremental=True)
+
+        locMarker = self.map.set_marker(spot.get('lat'), spot.get('lng'), text=spot.get('locName'))
+        locMarker.data = self.handlers[id]
+        locMarker.command = self.load_hotspot
+        return(locMarker)
+
+    def draw_cluster(self, cluster):
+
+        '''Draws an aggregate marker for a cluster of hotspots; clicking it zooms in on the cluster'''
+
+        text = cluster['locName'] if cluster['count'] == 1 else f"{cluster['count']} hotspots"
+        clusterMarker = self.map.set_marker(cluster['lat'], cluster['lng'], text=text, text_color='#144870',
+                                            marker_color_circle='#144870', marker_color_outside='#1F6AA5')
+        clusterMarker.command = lambda m, c=cluster: self.zoom_to_cluster(c)
+        return(clusterMarker)
+
+    def zoom_to_cluster(self, cluster):
+
+        '''Centers the map on a cluster and zooms in far enough for it to split apart'''
+
+        self.map.set_position(cluster['lat'], cluster['lng'])
+        self.map.set_zoom(round(self.map.zoom) + 2)
+
+    def get_viewport(self, margin: float = 0.25):
+
+        '''Returns the (south, west, north, east) bounds of the map view, padded by a fraction of its size'''
+
+        zoom = round(self.map.zoom)
+        north, west = tkmap.osm_to_decimal(*self.map.upper_left_tile_pos, zoom)
+        south, east = tkmap.osm_to_decimal(*self.map.lower_right_tile_pos, zoom)
+        lat_pad = (north - south) * margin
+        lng_pad = (east - west) * margin
+        return((south - lat_pad, west - lng_pad, north + lat_pad, east + lng_pad))
+
+    def sync_markers(self, visible, in_view, draw):
+
+        '''Removes markers that left the view and draws markers that entered it \n
+        Returns the number of markers removed'''
+
+        removed = [id for id in visible if id not in in_view]
+        for id in removed:
+            visible.pop(id).delete()
+
+        for id, item in in_view.items():
+            if id not in visible:
+                visible[id] = draw(item)
+        return(len(removed))
+
+    # Shows hotspots when zoomed in and clusters of hotspots when zoomed out to avoid clutter
     def update_markers(self, zoom):
 
-        '''Controls marker visibility on the map based on map zoom'''
+        '''Adds markers for hotspots or clusters entering the view and removes markers for those leaving it'''
+
+        with birdtool.profiler.span('update_markers'):
+            self.sync_view(zoom)
 
-        if zoom <= 11.5 and self.map.canvas_marker_list:
-            self.map.delete_all_marker()
-            # Reconfigure cursor on map canvas widget to avoid 'frozen' cursor
+    def sync_view(self, zoom):
+
+        '''Syncs the drawn markers with the hotspots or clusters in view; called by update_markers'''
+
+        hotspots = {}
+        clusters = {}
+        viewport = self.get_viewport()
+
+        if zoom >= 11.5:
+            hotspots = {spot.get('locId'): spot for spot in self.hotspot_index.query(*viewport)}
+        else:
+            clusters = {cluster['clusterId']: cluster for cluster in self.cluster_index.query(zoom, *viewport)}
+
+        self.prefetcher.set_targets(list(hotspots.values()), self.map.get_position())
+
+        removed = self.sync_markers(self.visible_markers, hotspots, self.draw_marker)
+        removed += self.sync_markers(self.visible_clusters, clusters, self.draw_cluster)
+        # Reconfigure cursor on map canvas widget to avoid 'frozen' cursor
+        if removed:
             self.map.canvas.configure(cursor='')
-        elif zoom >= 11.5 and not self.map.canvas_marker_list:
-            # Utilizes stored marker attributes to redraw markers
-            for marker in self.marker_attributes:
-                pos = marker['pos']
-                locMarker = tkmap.map_widget.CanvasPositionMarker(self.map, (pos[0], pos[1]), text=marker['name'])
-                locMarker.data = marker['data']
-                locMarker.command = marker['command']
-                locMarker.draw()
-                self.map.canvas_marker_list.append(locMarker)
 
     def zoom_polling(self):
 
-        '''Polls the map in 100ms intervals to check map zoom conditions \n
-        Controls minimum zoom and prompts marker updates'''
+        '''Polls the map in 100ms intervals to check for zoom or position changes \n
+        Prompts marker updates'''
 
-        current_zoom = self.map.zoom
+        current_view = (self.map.zoom, tuple(self.map.upper_left_tile_pos))
 
-        # Zoom limits based on markers existing, avoids heavy lag
-        if self.map.canvas_marker_list:
-            self.map.min_zoom = 10
-        else:
-            self.map.min_zoom = 0
         # Prompts a marker update check
-        if current_zoom != self.last_zoom:
-            self.last_zoom = current_zoom
-            self.update_markers(current_zoom)
+        if current_view != self.last_view:
+            self.last_view = current_view
+            self.update_markers(self.map.zoom)
         self.after(100, self.zoom_polling)
     
-    def observation_unpacker(self, marker):
+    def load_hotspot(self, marker):
 
-        '''Unpacks observation data values from a hotspot into a dictionary and passes it to be displayed on the GUI'''
+        '''Starts loading a clicked hotspot, superseding a hotspot that is still loading'''
 
-        # Terminates function if data is already loading or location is already displayed
-        if self.command_lock == True or marker.text == self.master.current_location:
+        # Terminates function if the location is already loading or displayed
+        if marker.text == self.master.current_location:
             return
-        
-        # Locks further functions from being executed to avoid deletion of objects being drawn
-        self.command_lock = True
-        # Possibly redundant with the command lock
-        with self.thread_lock:
-            self.observations = marker.data.sort_observations()
-            self.obs_json = [bird.__dict__ for bird in self.observations.values()]
-        self.master.after(0, self.master.display_data, self.obs_json, marker.text)
+
+        self.master.start_loading(marker.text)
+        # Follows the click through to the rendered list when profiling is turned on
+        trace = birdtool.profiler.start_trace(marker.text)
+        self.scheduler.submit('hotspot', self.observation_unpacker, marker, trace)
+
+    def observation_unpacker(self, job, marker, trace=None):
+
+        '''Unpacks observation data values from a hotspot into a dictionary and passes it to be displayed on the GUI \n
+        Partial results are passed along while checklists are still loading; runs as a scheduler job'''
+
+        if trace is not None:
+            trace.mark('queued')
+        last_update = [0.0]
+
+        # Called after each checklist is folded in; updates are limited to one every 250ms to keep the GUI responsive
+        def push_progress(loaded, total):
+            now = time.monotonic()
+            if now - last_update[0] >= 0.25:
+                last_update[0] = now
+                partial = [bird.as_dict() for bird in marker.data.snapshot().values()]
+                job.post(self.master.show_progress, partial, loaded, total)
+
+        # Background prefetching yields to the user's click until it has loaded
+        self.prefetcher.pause()
+        try:
+            self.observations = marker.data.sort_observations(on_progress=push_progress, cancel=job.cancel_event)
+            self.obs_json = [bird.as_dict() for bird in self.observations.values()]
+        except OSError:
+            job.post(self.master.loading_failed, marker.text, trace)
+            return
+        except Exception:
+            # A bad response or cache error still has to release the panel, or the hotspot can't be clicked again
+            traceback.print_exc()
+            job.post(self.master.loading_failed, marker.text, trace, False)
+            return
+        finally:
+            self.prefetcher.resume()
+        if trace is not None:
+            trace.mark('loaded')
+        job.post(self.master.display_data, self.obs_json, marker.text, job.cancelled(), trace)
 
 # Main GUI window
 class birdApp(ctk.CTk):
@@ -218,12 +505,22 @@ class birdApp(ctk.CTk):
         super().__init__()
 
         self.current_location = ''
+        # Search index over the current hotspot's common names and the pending as-you-type search
+        self.search_index = birdtool.NameSearchIndex([])
+        self.search_job = None
 
         # Window and file initialization
         self.title('Bird Tracker')
         self.set_window()
-        self.taxonomy = birdtool.load_taxonomy()
-        self.hotspots = birdtool.load_hotspots()
+        # Background work runs on the scheduler's workers; their results reach the widgets through pump_jobs
+        self.scheduler = birdtool.JobScheduler()
+        self.pump_jobs()
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        # Stale hotspot caches are shown right away and swapped out once their background refresh finishes
+        self.hotspots = birdtool.load_hotspots(regions, on_refresh=lambda hotspots: self.scheduler.post(self.update_hotspots, hotspots))
+        # Hotspot names can be typed into the address bar and resolve without a network request
+        birdtool.get_geocoder().set_hotspots(self.hotspots)
+        self.clusters = birdtool.load_clusters(self.hotspots)
 
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=5)
@@ -241,6 +538,7 @@ class birdApp(ctk.CTk):
         
         self.bird_search.grid(row=0, column=0, padx=10, pady=10, sticky='ew')
         self.bird_search.bind('<Return>', self.search_bird)
+        self.bird_search.bind('<KeyRelease>', self.schedule_search)
 
         # Makes a label to help the user remember where the data comes from
         self.location_label = ctk.CTkLabel(self.display_frame, 
@@ -251,10 +549,22 @@ class birdApp(ctk.CTk):
         
         self.location_label.grid(row=1, column=0, padx=10, pady=(0,15))
 
-        self.data_frame = ctk.CTkScrollableFrame(self.display_frame)
+        self.data_frame = birdList(self.display_frame)
         self.data_frame.grid(row=2, column=0, padx=0, pady=0, sticky='nsew')
-        self.data_frame.grid_rowconfigure(0, weight=1)
-        self.data_frame.grid_columnconfigure(0, weight=1)
+
+        # Shows loading progress; the cancel button is only shown while a hotspot is loading
+        self.progress_label = ctk.CTkLabel(self.display_frame, text='', font=('arial', 12), anchor='center')
+        self.progress_label.grid(row=3, column=0, padx=10, pady=(5,0))
+
+        self.cancel_button = ctk.CTkButton(self.display_frame, text='Cancel', command=self.cancel_loading)
+        self.cancel_button.grid(row=4, column=0, padx=10, pady=(5,10))
+        self.cancel_button.grid_remove()
+
+        # Shows the last click's timing breakdown; only created when profiling is turned on
+        self.profile_label = None
+        if birdtool.profiler.enabled:
+            self.profile_label = ctk.CTkLabel(self.display_frame, text='', font=('courier', 11), justify='left', anchor='w')
+            self.profile_label.grid(row=5, column=0, padx=10, pady=(0,10), sticky='ew')
 
         # Create an instance of the mapFrame class and assign it to the grid
         self.mapframe = mapFrame(self)
@@ -280,67 +590,141 @@ class birdApp(ctk.CTk):
         self.geometry(f'{w_width}x{w_height}+{x}+{y}')
         self.minsize(w_width, w_height)
 
-    def display_data(self, data, name):
+    def update_hotspots(self, hotspots):
+
+        '''Replaces the hotspots shown on the map with a refreshed hotspot cache'''
+
+        self.hotspots = hotspots
+        self.clusters = birdtool.load_clusters(self.hotspots)
+        birdtool.get_geocoder().set_hotspots(self.hotspots)
+        self.mapframe.reload_hotspots(self)
+
+    def start_loading(self, name):
+
+        '''Clears the display and switches it to a hotspot whose checklists are loading'''
 
-        '''Displays passed observation data within birdFrame objects'''
-        
-        # Clears any existing frame objects
-        for frame in self.data_frame.winfo_children():
-            if isinstance(frame, birdFrame) and frame.winfo_exists():
-                frame.destroy()
-        
         # Set current location and update the label
         self.current_location = name
         self.location_label.configure(text=f"Current hotspot: {self.current_location}")
 
-        # Placeholder text must be configured separately to actually update the widget.
-        self.bird_search.configure(placeholder_text='Loading...')
-        self.bird_search.configure(state='disabled')
+        self.data_frame.set_records([])
+        self.search_index = birdtool.NameSearchIndex([])
+        self.progress_label.configure(text='Loading checklists...')
+        self.cancel_button.grid()
 
-        def create_frames():
+    def show_progress(self, data, loaded, total):
 
-            '''Creates a list of birdFrame instances mapping to hotspot observation data'''
+        '''Displays partial observation data while the remaining checklists load'''
 
-            frames = [birdFrame(self.data_frame, bird) for bird in data]
-            self.data_frame.after(0, lambda: grid_loader(frames, delay=100))
+        self.show_results(data)
+        self.progress_label.configure(text=f"{loaded} of {total} checklists loaded")
 
-        def grid_loader(frames, delay, i=0):
+    def show_results(self, data):
 
-            '''Loads a list of frames individually \n
-            Done to avoid lag associated with bulk loading'''
+        '''Replaces the listed observation data, keeping the current search and scroll position'''
 
-            if i < len(frames):
-                frames[i].grid(row=i, column=0, padx=5, pady=5, sticky='nsew')
-                self.data_frame.after(delay, lambda: grid_loader(frames, delay, i + 1))
-            else:
-                # Allows marker commands to be run again after bird frames finish loading
-                self.mapframe.command_lock = False
-                # Configure in opposite order to update placeholder text when state is normal
-                self.bird_search.configure(state='normal')
-                self.bird_search.configure(placeholder_text='Enter species name')
-                self.data_frame._parent_canvas.yview_moveto(0)
+        with birdtool.profiler.span('show_results'):
+            self.search_index = birdtool.NameSearchIndex([bird['common_name'] for bird in data])
+            matches = self.search_index.search(self.bird_search.get())
+            self.data_frame.set_records(data, matches, keep_position=True)
+
+    def display_data(self, data, name, cancelled=False, trace=None):
+
+        '''Displays passed observation data in the bird list'''
 
-        threading.Thread(target=create_frames).start()
+        if trace is not None:
+            trace.mark('delivered')
+
+        # Set current location and update the label
+        self.current_location = name
+        self.location_label.configure(text=f"Current hotspot: {self.current_location}")
+
+        # Only the rows in view are bound to data, so the whole list is ready at once
+        self.show_results(data)
+
+        if cancelled:
+            self.progress_label.configure(text=f"Loading cancelled; showing {len(data)} species")
+            # Lets the hotspot be clicked again to load the remaining checklists
+            self.current_location = ''
+        else:
+            self.progress_label.configure(text=f"{len(data)} species")
+        self.cancel_button.grid_remove()
+
+        if trace is not None:
+            # Tk redraws changed widgets once idle, so that work is flushed here to be counted in the trace
+            self.update_idletasks()
+            trace.mark('displayed')
+            self.show_trace(birdtool.profiler.finish_trace(trace, species=len(data), cancelled=cancelled))
+
+    def loading_failed(self, name, trace=None, unreachable: bool = True):
+
+        '''Reports a hotspot whose checklists couldn't be fetched; checklists already loaded stay displayed \n
+        unreachable is False for errors other than a failed connection'''
+
+        self.progress_label.configure(text=f"Couldn't reach eBird to load {name}" if unreachable else f"Couldn't load {name}")
+        self.cancel_button.grid_remove()
+        # Lets the hotspot be clicked again to retry
+        self.current_location = ''
+
+        if trace is not None:
+            self.show_trace(birdtool.profiler.finish_trace(trace, failed=True))
+
+    def show_trace(self, breakdown):
+
+        '''Shows a click's timing breakdown: the time spent in each stage, the slowest spans and the counters'''
+
+        stages = []
+        previous = 0.0
+        for stage in ('queued', 'loaded', 'delivered', 'displayed'):
+            if stage in breakdown['marks']:
+                stages.append(f"{stage} {breakdown['marks'][stage] - previous:.0f}")
+                previous = breakdown['marks'][stage]
+
+        lines = [f"{breakdown['total_ms']:.0f} ms: " + ', '.join(stages)]
+        slowest = sorted(breakdown['spans'].items(), key=lambda item: item[1]['ms'], reverse=True)[:5]
+        lines += [f"{name}: {span['calls']} in {span['ms']:.0f} ms" for name, span in slowest]
+        if breakdown['counters']:
+            lines.append(', '.join(f'{name} {count}' for name, count in sorted(breakdown['counters'].items())))
+        self.profile_label.configure(text='\n'.join(lines))
+
+    def cancel_loading(self):
+
+        '''Stops loading the current hotspot; checklists already loaded stay displayed'''
+
+        self.scheduler.cancel('hotspot')
+
+    def pump_jobs(self):
+
+        '''Runs results posted by background jobs on the Tk thread, then checks again in 20ms'''
+
+        self.scheduler.drain()
+        self.after(20, self.pump_jobs)
+
+    def close(self):
+
+        '''Cancels background jobs and closes the window'''
+
+        self.scheduler.shutdown()
+        self.destroy()
+
+    def schedule_search(self, event):
+
+        '''Searches once typing has paused, so a burst of keystrokes only runs one search'''
+
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(150, self.search_bird, None)
 
     def search_bird(self, event):
 
-        '''Modifies the currently displayed frames to show birds matching a search entry'''
+        '''Modifies the bird list to show birds matching a search entry'''
 
-        # Normalizing the user's entry for matching
-        entry_string = self.bird_search.get().strip().lower()
-        # Grabs all children of the data frame widget
-        current_frames = self.data_frame.winfo_children()
-        
-        # Matches search bar entry with bird commons names and displays matching frames
-        for frame in current_frames:
-            if not entry_string or entry_string in frame.name.lower():
-                frame.grid()
-            else:
-                frame.grid_remove()
-        
-        # Resets to the top of the scrollbar
-        # Avoids the user being outside of the currently displayed frames
-        self.data_frame._parent_canvas.yview_moveto(0)
+        self.search_job = None
+        matches = self.search_index.search(self.bird_search.get())
+
+        # Leaves the list and its scroll position alone when the matches haven't changed
+        if matches != self.data_frame.visible:
+            self.data_frame.set_visible(matches)
 
 if __name__ == '__main__':
     app = birdApp()
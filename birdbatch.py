@@ -0,0 +1,247 @@
+import birdtool
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # pyarrow is optional and only needed for --parquet
+    pyarrow = None
+
+# Headless batch mode: summarizes hotspots without the GUI and writes one JSON line per hotspot
+# Lines are appended as hotspots finish, so running the same command again after an interruption resumes it
+
+# Set up once in each worker process by start_worker
+worker_fetcher = None
+worker_recorder = None
+
+def start_worker(api_key, cache_path, fixture_path, offline, record, rate):
+
+    '''Creates the checklist fetcher that a worker process uses for every hotspot it summarizes'''
+
+    global worker_fetcher, worker_recorder
+
+    # Each process has its own eBird client, so the workers split the request rate between them
+    birdtool.ebird_client = birdtool.EbirdClient(rate=rate)
+    api = birdtool.get_ebird_client()
+    if fixture_path is not None:
+        api = birdtool.FixtureApi.load(fixture_path)
+        # A fixture carries the names of every species it recorded, so replays don't depend on the taxonomy cache
+        if api.taxonomy is not None:
+            birdtool.taxonomy_index = birdtool.TaxonomyIndex(api.taxonomy)
+    elif offline:
+        api = birdtool.FixtureApi()
+    # Processes that weren't forked from main load the taxonomy themselves; offline ones keep an expired cache
+    if (offline or fixture_path is not None) and birdtool.taxonomy_index is None:
+        birdtool.taxonomy_index = birdtool.TaxonomyIndex(birdtool.load_taxonomy(offline=True))
+    if record:
+        api = worker_recorder = birdtool.RecordingApi(api)
+
+    # Recordings and replays start from an empty cache; recordings so every checklist passes through the recorder
+    cache = birdtool.ChecklistCache(':memory:' if record or fixture_path is not None else cache_path)
+    worker_fetcher = birdtool.ChecklistFetcher(api_key, api=api, cache=cache, offline=offline or fixture_path is not None)
+
+def summarize_hotspot(spot, as_of, days_back):
+
+    '''Aggregates one hotspot's observations in a worker process \n
+    Returns its output record and, when recording, the visit lists and checklists fetched for it'''
+
+    handler = birdtool.BirdDataHandler(worker_fetcher.api_key, spot['locId'], days_back, fetcher=worker_fetcher)
+    handler.current_time = as_of
+    observations = handler.sort_observations()
+
+    record = {'locId': spot['locId'],
+              'locName': spot.get('locName'),
+              'as_of': as_of.strftime('%Y-%m-%d %H:%M'),
+              'days_back': days_back,
+              # sort_observations returns a list when the taxonomy is missing a species, matching what the GUI shows
+              'species': [data.as_dict() for data in observations.values()] if observations else []
+              }
+    recorded = worker_recorder.fixture(clear=True) if worker_recorder is not None else None
+    return(record, recorded)
+
+def select_hotspots(args):
+
+    '''Returns the hotspots named on the command line, or a region's cached hotspots inside the optional bounding box'''
+
+    if args.hotspots:
+        return([{'locId': id, 'locName': None} for id in args.hotspots])
+
+    hotspot_path = birdtool.hotspot_store_path(args.region)
+    if args.offline or args.fixture:
+        if not os.path.exists(hotspot_path):
+            sys.exit(f'No hotspot cache for {args.region}; run once online or pass --hotspots')
+        hotspots = birdtool.HotspotStore.open(hotspot_path)
+    else:
+        hotspots = birdtool.refresh_hotspot_cache(args.region)
+
+    if args.bbox:
+        spots = birdtool.HotspotGrid(hotspots).query(*args.bbox)
+    else:
+        spots = list(hotspots)
+    return([{'locId': spot['locId'], 'locName': spot['locName']} for spot in spots])
+
+def completed_hotspots(path):
+
+    '''Returns the locIds already written to an output file \n
+    A line cut off by an interruption is truncated away so the next record starts on a clean line'''
+
+    done = set()
+    if not os.path.exists(path):
+        return(done)
+
+    complete = 0
+    with open(path, 'rb+') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(json.loads(line)['locId'])
+            except (ValueError, KeyError):
+                break
+            complete += len(line)
+        f.truncate(complete)
+    return(done)
+
+def write_parquet(jsonl_path, parquet_path):
+
+    '''Writes a JSON Lines output file as a Parquet table with one row per hotspot and species \n
+    Counts of 'X' become nulls so num_obs stays an integer column'''
+
+    columns = {name: [] for name in ('locId', 'locName', 'as_of', 'species_code', 'common_name', 'num_obs', 'time_since', 'checklist_count')}
+
+    with open(jsonl_path, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            for data in record['species']:
+                for name in ('locId', 'locName', 'as_of'):
+                    columns[name].append(record[name])
+                for name in ('species_code', 'common_name', 'time_since', 'checklist_count'):
+                    columns[name].append(data[name])
+                columns['num_obs'].append(data['num_obs'] if data['num_obs'] != 'X' else None)
+
+    pyarrow.parquet.write_table(pyarrow.table(columns), parquet_path)
+
+def save_fixture(path, recording, as_of):
+
+    '''Writes a recording as a fixture along with its reference time, the region's hotspots and the names of the species it contains'''
+
+    taxonomy = birdtool.get_taxonomy_index()
+    codes = {obs.get('speciesCode') for checklist in recording['checklists'].values() for obs in checklist.get('obs')}
+    fixture = {'recorded_at': as_of.strftime('%Y-%m-%d %H:%M'),
+               'hotspots': recording['hotspots'],
+               'visits': recording['visits'],
+               'checklists': recording['checklists'],
+               'taxonomy': {code: taxonomy.common_name(code) for code in codes if code in taxonomy}
+               }
+    with open(path, 'w') as f:
+        f.write(json.dumps(fixture))
+
+def main(argv=None):
+
+    '''Runs the batch mode from command line arguments and returns its exit status'''
+
+    parser = argparse.ArgumentParser(description='Summarizes eBird hotspots without the GUI, writing one JSON line per hotspot')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--hotspots', nargs='+', metavar='LOC_ID', help='hotspot IDs to summarize')
+    target.add_argument('--region', help='eBird region whose cached hotspots are summarized, e.g. US-VA')
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+                        help="only summarize the region's hotspots inside this box")
+    parser.add_argument('--days-back', type=int, default=14, help='days of checklists to aggregate, up to 14')
+    parser.add_argument('--output', default='hotspot_summaries.jsonl', help='JSON Lines file to append results to')
+    parser.add_argument('--parquet', metavar='PATH', help='also write the results as a Parquet table; needs pyarrow')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='worker processes')
+    parser.add_argument('--fresh', action='store_true', help='start the output over instead of resuming it')
+    parser.add_argument('--offline', action='store_true', help='only use visit lists and checklists in the checklist cache')
+    parser.add_argument('--fixture', metavar='PATH', help='replay a fixture recorded with --record instead of calling eBird')
+    parser.add_argument('--record', metavar='PATH', help='record every response into a fixture for offline replays')
+    parser.add_argument('--as-of', help="reference time as 'YYYY-MM-DD HH:MM'; defaults to now, or the fixture's recording time")
+    parser.add_argument('--cache', default='checklist_cache.db', help='checklist cache file')
+    args = parser.parse_args(argv)
+
+    if args.bbox and not args.region:
+        parser.error('--bbox needs --region')
+    if not 1 <= args.days_back <= 14:
+        parser.error('--days-back must be between 1 and 14')
+    if args.record and (args.offline or args.fixture):
+        parser.error('--record needs live eBird responses')
+    if args.parquet and pyarrow is None:
+        parser.error('--parquet needs pyarrow installed')
+
+    fixture = birdtool.FixtureApi.load(args.fixture) if args.fixture else None
+    if args.as_of:
+        as_of = birdtool.parse_obs_dt(args.as_of)
+    elif fixture is not None and fixture.recorded_at:
+        as_of = birdtool.parse_obs_dt(fixture.recorded_at)
+    else:
+        as_of = datetime.datetime.now()
+
+    if fixture is not None and fixture.taxonomy is not None:
+        birdtool.taxonomy_index = birdtool.TaxonomyIndex(fixture.taxonomy)
+    elif args.offline or args.fixture:
+        if not os.path.exists('taxonomy_cache.json'):
+            parser.error('offline runs need taxonomy_cache.json or a fixture with a taxonomy')
+        # An expired cache is still used rather than fetched again
+        birdtool.taxonomy_index = birdtool.TaxonomyIndex(birdtool.load_taxonomy(offline=True))
+    # Loaded before the pool starts so forked workers inherit it instead of each reading the file
+    birdtool.get_taxonomy_index()
+
+    spots = select_hotspots(args)
+    if args.fresh and os.path.exists(args.output):
+        os.remove(args.output)
+    done = completed_hotspots(args.output)
+    pending = [spot for spot in spots if spot['locId'] not in done]
+    print(f'{len(spots) - len(pending)} of {len(spots)} hotspots already summarized', file=sys.stderr)
+
+    recording = {'hotspots': {}, 'visits': {}, 'checklists': {}}
+    # The region's hotspots go into the fixture too, so benchmarks can replay load_hotspots from it
+    if args.record and args.region:
+        recording['hotspots'][args.region] = list(birdtool.HotspotStore.open(birdtool.hotspot_store_path(args.region)))
+    failures = 0
+    start = time.monotonic()
+    initargs = (birdtool.api_key, args.cache, args.fixture, args.offline, bool(args.record), birdtool.get_ebird_client().bucket.rate / args.workers)
+
+    with open(args.output, 'a') as out, ProcessPoolExecutor(max_workers=args.workers, initializer=start_worker, initargs=initargs) as pool:
+        futures = {pool.submit(summarize_hotspot, spot, as_of, args.days_back): spot for spot in pending}
+        try:
+            for finished, future in enumerate(as_completed(futures), 1):
+                spot = futures[future]
+                try:
+                    record, recorded = future.result()
+                except Exception as e:
+                    # Failed hotspots aren't written, so the next run retries them; a malformed checklist fails only its own hotspot
+                    failures += 1
+                    print(f'[{finished}/{len(pending)}] {spot["locId"]} failed: {type(e).__name__}: {e}', file=sys.stderr)
+                    continue
+
+                # Each record is flushed on its own so an interruption loses at most the hotspots in flight
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                if recorded is not None:
+                    recording['visits'].update(recorded['visits'])
+                    recording['checklists'].update(recorded['checklists'])
+
+                elapsed = time.monotonic() - start
+                remaining = elapsed / finished * (len(pending) - finished)
+                print(f'[{finished}/{len(pending)}] {spot["locId"]}: {len(record["species"])} species, '
+                      f'{elapsed:.0f}s elapsed, about {remaining:.0f}s left', file=sys.stderr)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            print('Interrupted; run the same command again to resume', file=sys.stderr)
+            return(130)
+        finally:
+            if args.record:
+                save_fixture(args.record, recording, as_of)
+
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+    return(1 if failures else 0)
+
+if __name__ == '__main__':
+    sys.exit(main())
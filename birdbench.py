@@ -0,0 +1,433 @@
+import birdtool
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+import types
+import random
+import time
+import json
+import sys
+import os
+
+# Benchmarks for birdtool hot paths; results are printed as one JSON object per line
+# eBird responses are replayed from fixtures through FixtureApi, so no benchmark reaches the network
+
+# Synthetic scaling sizes for each benchmark; --quick runs the first of each
+sizes = {'hotspot_cache': (1000, 5000, 20000),
+         'aggregation': (100, 1000, 10000),
+         'load_hotspots': (1000, 5000, 20000),
+         'replay': (100, 500, 1000),
+         'markers': (100, 500, 2000),
+         'display_data': (100, 500, 2000)
+         }
+
+# Roughly the size of the full eBird taxonomy
+taxonomy_size = 17000
+
+# Synthetic fixtures are recorded at this fixed time, so a replay loads the same checklists whatever time of day it runs
+recorded_at = datetime.datetime(2026, 1, 15, 12, 0)
+
+# What identifies a result across runs; counts a benchmark reports about its output are left out since they can vary
+key_fields = ('benchmark', 'size', 'region', 'fixture')
+
+def synthetic_hotspots(count, seed=0):
+
+    '''Generates hotspot dictionaries spread over Virginia in the same shape as the hotspot cache'''
+
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    return [{'locName': f"{rng.choice(['Lake', 'Park', 'Trail', 'Farm', 'Marsh'])} {i} ({rng.choice(['Albemarle', 'Fairfax', 'Augusta'])} Co.)",
+             'locId': f'L{1000000 + i}',
+             'lat': rng.uniform(36.5, 39.5),
+             'lng': rng.uniform(-83.5, -75.2),
+             'latestObsDt': (now - datetime.timedelta(minutes=rng.randint(0, 14 * 1440))).strftime('%Y-%m-%d %H:%M')
+             } for i in range(count)]
+
+def synthetic_checklists(count, species=300, seed=0, now=None):
+
+    '''Generates checklists in the shape returned by get_checklist along with a taxonomy covering their species \n
+    Checklists fall within 14 days before now and start on the quarter hour so obsDt strings repeat the way they do in real data'''
+
+    rng = random.Random(seed)
+    now = now if now is not None else datetime.datetime.now()
+    codes = [f'sp{i:04d}' for i in range(species)]
+    checklists = []
+    for i in range(count):
+        obs_dt = (now - datetime.timedelta(minutes=rng.randrange(0, 14 * 1440, 15))).strftime('%Y-%m-%d %H:%M')
+        checklists.append({'subId': f'S{100000000 + i}',
+                           'obs': [{'speciesCode': code, 'obsDt': obs_dt, 'howManyStr': rng.choice(['X', str(rng.randint(1, 40))])}
+                                   for code in rng.sample(codes, rng.randint(5, 60))]
+                           })
+    return(checklists, {code: f'Species {code}' for code in codes})
+
+def synthetic_fixture(hotspots=100, checklists=100, species=300, seed=0):
+
+    '''Generates a fixture in the form recorded by RecordingApi \n
+    Every checklist is a visit to the first hotspot, and the taxonomy is padded out to the size of eBird's'''
+
+    # Hotspots are dated from the clock since load_hotspots drops inactive ones against the current time
+    spots = synthetic_hotspots(hotspots, seed)
+    lists, taxonomy = synthetic_checklists(checklists, species, seed, recorded_at)
+    taxonomy.update({f'tx{i:05d}': f'Taxon {i}' for i in range(taxonomy_size - len(taxonomy))})
+
+    location = spots[0]['locId']
+    visits = {}
+    for data in lists:
+        obs_dt = data['obs'][0]['obsDt']
+        visits.setdefault(fixture_day(location, obs_dt), []).append({'subId': data['subId'], 'locId': location, 'obsDt': obs_dt})
+
+    return({'recorded_at': recorded_at.strftime('%Y-%m-%d %H:%M'),
+            'taxonomy': taxonomy,
+            'hotspots': {'US-VA': spots},
+            'visits': visits,
+            'checklists': {data['subId']: data for data in lists}
+            })
+
+def fixture_day(location, obs_dt):
+    '''Returns the fixture key of the visit list holding a checklist started at obs_dt'''
+    return(birdtool.fixture_key(location, birdtool.parse_obs_dt(obs_dt)))
+
+def busiest_location(fixture):
+    '''Returns the location with the most recorded visits in a fixture'''
+    counts = {}
+    for key, visits in fixture.visits.items():
+        location = key.split('|')[0]
+        counts[location] = counts.get(location, 0) + len(visits)
+    return(max(counts, key=counts.get) if counts else None)
+
+@contextlib.contextmanager
+def replay(fixture):
+
+    '''Runs the enclosed benchmark in a scratch directory with every eBird request answered from a FixtureApi \n
+    The shared client, taxonomy index and checklist cache are restored afterwards'''
+
+    cwd = os.getcwd()
+    shared = (birdtool.ebird_client, birdtool.taxonomy_index, birdtool.checklist_cache)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        birdtool.ebird_client = fixture
+        birdtool.taxonomy_index = None
+        birdtool.checklist_cache = None
+        try:
+            yield(tmp)
+        finally:
+            # Leaves the directory first so it can be removed on Windows
+            os.chdir(cwd)
+            birdtool.ebird_client, birdtool.taxonomy_index, birdtool.checklist_cache = shared
+
+def timed(func, repeat: int = 1):
+
+    '''Runs func repeat times and returns its last result and the fastest wall time in milliseconds'''
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return(result, round(best * 1000, 2))
+
+def measure(func):
+
+    '''Runs func once and returns its result, wall time in seconds and peak traced memory in bytes'''
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return(result, elapsed, peak)
+
+def bench_hotspot_cache(count):
+
+    '''Compares loading and indexing the JSON hotspot cache against the hotspot store'''
+
+    hotspots = synthetic_hotspots(count)
+    results = {'benchmark': 'hotspot_cache', 'hotspots': count}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'hotspot_cache.json')
+        store_path = os.path.join(tmp, 'hotspot_cache.bin')
+        with open(json_path, 'w') as f:
+            f.write(json.dumps(hotspots, indent=4))
+        birdtool.convert_hotspot_cache(json_path, store_path)
+
+        def load_json():
+            with open(json_path, 'r') as f:
+                return(json.load(f))
+
+        for name, load in (('json', load_json), ('store', lambda: birdtool.HotspotStore.open(store_path))):
+            loaded, elapsed, peak = measure(load)
+            grid, grid_elapsed, grid_peak = measure(lambda: birdtool.HotspotGrid(loaded))
+            results[name] = {'file_bytes': os.path.getsize(json_path if name == 'json' else store_path),
+                             'load_ms': round(elapsed * 1000, 2),
+                             'load_bytes_per_hotspot': round(peak / count, 1),
+                             'grid_ms': round(grid_elapsed * 1000, 2),
+                             'grid_bytes_per_hotspot': round(grid_peak / count, 1)
+                             }
+    return(results)
+
+def bench_aggregation(count):
+
+    '''Times aggregating a batch of checklists with and without NumPy'''
+
+    checklists, taxonomy = synthetic_checklists(count)
+    now = datetime.datetime.now()
+    results = {'benchmark': 'aggregation', 'checklists': count, 'observations': sum(len(data['obs']) for data in checklists)}
+
+    modes = [('python', False)] + ([('numpy', True)] if birdtool.numpy is not None else [])
+    for name, use_numpy in modes:
+        birdtool.parse_obs_dt.cache_clear()
+        start = time.perf_counter()
+        birdtool.aggregate_checklists(checklists, now, taxonomy, use_numpy)
+        results[name] = {'aggregate_ms': round((time.perf_counter() - start) * 1000, 2)}
+    return(results)
+
+def bench_load_taxonomy(fixture):
+
+    '''Times load_taxonomy fetching the taxonomy into an empty directory, reading the cache back and indexing it'''
+
+    with replay(fixture):
+        _, cold_ms = timed(birdtool.load_taxonomy)
+        taxonomy, warm_ms = timed(birdtool.load_taxonomy, repeat=3)
+        _, index_ms = timed(lambda: birdtool.TaxonomyIndex(taxonomy), repeat=3)
+    return({'benchmark': 'load_taxonomy', 'species': len(taxonomy), 'cold_ms': cold_ms, 'warm_ms': warm_ms, 'index_ms': index_ms})
+
+def bench_load_hotspots(fixture, region='US-VA'):
+
+    '''Times load_hotspots building a region's store from the recorded hotspots and opening the fresh store again \n
+    Hotspots recorded more than 14 days before now are dropped the same way a live refresh drops them'''
+
+    with replay(fixture):
+        hotspots, cold_ms = timed(lambda: birdtool.load_hotspots((region,)))
+        _, warm_ms = timed(lambda: birdtool.load_hotspots((region,)), repeat=3)
+    return({'benchmark': 'load_hotspots', 'region': region, 'recorded': len(fixture.get_hotspots(None, region)),
+            'hotspots': len(hotspots), 'cold_ms': cold_ms, 'warm_ms': warm_ms})
+
+def bench_replay(fixture, location=None):
+
+    '''Times gather_checklists and sort_observations for one location as of the fixture's recording time \n
+    Cold gathers fill an in-memory checklist cache from the fixture; warm gathers and sorts read from that cache'''
+
+    location = location if location is not None else busiest_location(fixture)
+    reference_time = birdtool.parse_obs_dt(fixture.recorded_at) if fixture.recorded_at else datetime.datetime.now()
+
+    with replay(fixture):
+        birdtool.taxonomy_index = birdtool.TaxonomyIndex(fixture.taxonomy or {})
+        fetcher = birdtool.ChecklistFetcher(None, api=fixture, cache=birdtool.ChecklistCache(':memory:'), offline=True)
+        handler = birdtool.BirdDataHandler(None, location, fetcher=fetcher)
+        handler.current_time = reference_time
+
+        checklists, cold_ms = timed(handler.gather_checklists)
+        _, warm_ms = timed(handler.gather_checklists, repeat=3)
+
+        def sort():
+            birdtool.parse_obs_dt.cache_clear()
+            return(handler.sort_observations())
+        observations, sort_ms = timed(sort, repeat=3)
+
+    return({'benchmark': 'replay', 'location': location, 'checklists': len(checklists), 'species': len(observations),
+            'gather_cold_ms': cold_ms, 'gather_warm_ms': warm_ms, 'sort_observations_ms': sort_ms})
+
+def open_app():
+
+    '''Imports the GUI module and opens a window for the widget benchmarks \n
+    Returns the module and window, or None when there is no display to open it on'''
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'birdapp (1).py')
+    spec = importlib.util.spec_from_file_location('birdapp', path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+
+    try:
+        root = app.ctk.CTk()
+    except app.tk.TclError:
+        return(None)
+    root.geometry('1000x800')
+    root.update()
+    return(app, root)
+
+def bench_markers(gui, count):
+
+    '''Times drawing markers for count hotspots in view through mapFrame.draw_marker, then removing them \n
+    Tiles are left blank so only marker creation is measured'''
+
+    app, root = gui
+
+    class blankMapView(app.tkmap.TkinterMapView):
+        def request_image(self, zoom, x, y, db_cursor=None):
+            return self.empty_tile_image
+
+    map_widget = blankMapView(root, width=800, height=600)
+    map_widget.pack()
+    map_widget.set_position(38.0, -79.3)
+    map_widget.set_zoom(7)
+    root.update()
+
+    # Stands in for mapFrame with just the attributes draw_marker uses
+    frame = types.SimpleNamespace(handlers={}, map=map_widget, load_hotspot=lambda marker: None)
+    hotspots = synthetic_hotspots(count)
+
+    def draw():
+        markers = {spot['locId']: app.mapFrame.draw_marker(frame, spot) for spot in hotspots}
+        root.update_idletasks()
+        return(markers)
+    markers, draw_ms = timed(draw)
+
+    def remove():
+        app.mapFrame.sync_markers(frame, markers, {}, None)
+        root.update_idletasks()
+    _, remove_ms = timed(remove)
+
+    map_widget.destroy()
+    return({'benchmark': 'markers', 'hotspots': count, 'draw_ms': draw_ms, 'remove_ms': remove_ms})
+
+def bench_display_data(gui, count):
+
+    '''Times birdApp.display_data showing count species in the bird list, then showing them again'''
+
+    app, root = gui
+    checklists, taxonomy = synthetic_checklists(count * 2, species=count)
+    data = [bird.as_dict() for bird in birdtool.aggregate_checklists(checklists, datetime.datetime.now(), taxonomy).values()]
+
+    # Stands in for birdApp with just the widgets display_data uses
+    window = types.SimpleNamespace(location_label=app.ctk.CTkLabel(root), progress_label=app.ctk.CTkLabel(root),
+                                   cancel_button=app.ctk.CTkButton(root), bird_search=app.ctk.CTkEntry(root),
+                                   data_frame=app.birdList(root))
+    window.show_results = lambda data: app.birdApp.show_results(window, data)
+    window.data_frame.pack(fill='both', expand=True)
+    root.update()
+
+    def display():
+        app.birdApp.display_data(window, data, 'Benchmark hotspot')
+        root.update_idletasks()
+    _, first_ms = timed(display)
+    _, again_ms = timed(display, repeat=3)
+
+    for widget in (window.location_label, window.progress_label, window.cancel_button, window.bird_search, window.data_frame):
+        widget.destroy()
+    return({'benchmark': 'display_data', 'species': len(data), 'rows': len(window.data_frame.rows), 'first_ms': first_ms, 'again_ms': again_ms})
+
+def run_metadata():
+
+    '''Describes the machine and revision a run was made on so saved results can be told apart'''
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return({'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M'),
+            'revision': revision,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': birdtool.numpy is not None
+            })
+
+def flatten_timings(result, prefix=''):
+    '''Returns every millisecond timing in a result keyed by its dotted path'''
+    timings = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            timings.update(flatten_timings(value, f'{prefix}{key}.'))
+        elif key.endswith('_ms'):
+            timings[prefix + key] = value
+    return(timings)
+
+def result_key(result):
+    '''Returns what identifies a result across runs: its benchmark and the input it ran on'''
+    return(tuple((key, result[key]) for key in key_fields if key in result))
+
+def compare(baseline, results, tolerance: float = 0.2, floor_ms: float = 1.0):
+
+    '''Returns a line for each timing that is more than tolerance slower than the baseline run \n
+    Differences under floor_ms are treated as noise'''
+
+    previous = {result_key(result): flatten_timings(result) for result in baseline['results']}
+    regressions = []
+    for result in results:
+        for name, ms in flatten_timings(result).items():
+            before = previous.get(result_key(result), {}).get(name)
+            if before is not None and ms > before * (1 + tolerance) and ms - before >= floor_ms:
+                sizes = ', '.join(f'{key}={value}' for key, value in result_key(result) if key != 'benchmark')
+                regressions.append(f"{result['benchmark']} ({sizes}) {name}: {before} -> {ms} ms")
+    return(regressions)
+
+def main(argv=None):
+
+    '''Runs the benchmarks from command line arguments and returns its exit status'''
+
+    parser = argparse.ArgumentParser(description='Benchmarks birdtool hot paths against synthetic data and recorded fixtures.')
+    parser.add_argument('--fixture', metavar='PATH', help='also replay a fixture recorded with birdbatch --record')
+    parser.add_argument('--quick', action='store_true', help='only run the smallest synthetic size of each benchmark')
+    parser.add_argument('--no-gui', action='store_true', help='skip the marker and display_data benchmarks')
+    parser.add_argument('--output', metavar='PATH', help='save the run and its results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='report timings that regressed against a run saved with --output')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='fraction slower than the baseline that counts as a regression')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    run = {k: v[:1] if args.quick else v for k, v in sizes.items()}
+    results = []
+
+    # Synthetic results carry the size they were generated at, which is what --compare matches them on
+    def report(result, size=None):
+        if size is not None:
+            result['size'] = size
+        print(json.dumps(result), flush=True)
+        results.append(result)
+
+    for count in run['hotspot_cache']:
+        report(bench_hotspot_cache(count), count)
+    for count in run['aggregation']:
+        report(bench_aggregation(count), count)
+
+    report(bench_load_taxonomy(birdtool.FixtureApi(synthetic_fixture())))
+    for count in run['load_hotspots']:
+        report(bench_load_hotspots(birdtool.FixtureApi(synthetic_fixture(hotspots=count))), count)
+    for count in run['replay']:
+        report(bench_replay(birdtool.FixtureApi(synthetic_fixture(checklists=count))), count)
+
+    if args.fixture:
+        fixture = birdtool.FixtureApi.load(args.fixture)
+        for region in fixture.hotspots:
+            report(dict(bench_load_hotspots(fixture, region), fixture=args.fixture))
+        if fixture.visits:
+            report(dict(bench_replay(fixture), fixture=args.fixture))
+
+    gui = None if args.no_gui else open_app()
+    if gui is not None:
+        for count in run['markers']:
+            report(bench_markers(gui, count), count)
+        for count in run['display_data']:
+            report(bench_display_data(gui, count), count)
+        gui[1].destroy()
+    elif not args.no_gui:
+        print('No display; skipped the marker and display_data benchmarks', file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps({'run': run_metadata(), 'results': results}, indent=4))
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.tolerance)
+        for line in regressions:
+            print(f'Regression: {line}', file=sys.stderr)
+        print(f"{len(regressions)} regressions against {baseline['run'].get('revision') or args.compare}", file=sys.stderr)
+        return(1 if regressions else 0)
+    return(0)
+
+if __name__ == '__main__':
+    sys.exit(main())
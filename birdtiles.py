@@ -0,0 +1,63 @@
+import birdtool
+import argparse
+import os
+import sys
+import time
+
+# Downloads map tiles into the tile cache ahead of time so the map can draw without the network
+
+def hotspot_bbox(regions):
+
+    '''Returns the south, west, north and east edges of the cached hotspots in some regions'''
+
+    hotspots = birdtool.load_hotspots(regions)
+    if not len(hotspots):
+        sys.exit('No cached hotspots to take a bounding box from; pass --bbox instead')
+    return(min(hotspots.lat), min(hotspots.lng), max(hotspots.lat), max(hotspots.lng))
+
+def main(argv=None):
+
+    '''Runs the tile prefetch from command line arguments and returns its exit status'''
+
+    parser = argparse.ArgumentParser(description='Downloads map tiles covering the hotspot cache into the tile cache')
+    parser.add_argument('--zoom', nargs=2, type=int, default=(6, 12), metavar=('MIN', 'MAX'), help='zoom levels to download, inclusive')
+    parser.add_argument('--regions', default=os.getenv('EBIRD_REGIONS', 'US-VA'),
+                        help='comma separated eBird regions whose hotspots set the bounding box')
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'), help='download this box instead')
+    parser.add_argument('--max-tiles', type=int, default=10000, help='refuse to start when more tiles than this are missing')
+    parser.add_argument('--stats', action='store_true', help="print the tile cache's counters and exit")
+    args = parser.parse_args(argv)
+
+    cache = birdtool.get_tile_cache()
+    if args.stats:
+        print(cache.stats())
+        return(0)
+
+    min_zoom, max_zoom = args.zoom
+    if not 0 <= min_zoom <= max_zoom <= 22:
+        parser.error('--zoom needs 0 <= MIN <= MAX <= 22')
+
+    bbox = args.bbox or hotspot_bbox([region.strip() for region in args.regions.split(',') if region.strip()])
+    tiles = birdtool.tiles_in_bbox(*bbox, min_zoom, max_zoom)
+    missing = cache.missing(birdtool.tile_server, tiles)
+    # Each zoom level has four times the tiles of the one before, so a high MAX gets out of hand quickly
+    if len(missing) > args.max_tiles:
+        parser.error(f'{len(missing)} of the {len(tiles)} tiles covering that area at zooms {min_zoom}-{max_zoom} are missing; '
+                     'lower MAX or raise --max-tiles')
+
+    start = time.monotonic()
+    last_report = [0.0]
+
+    def report(done, total):
+        now = time.monotonic()
+        if now - last_report[0] >= 1 or done == total:
+            last_report[0] = now
+            print(f'{done}/{total} tiles downloaded, {now - start:.0f}s elapsed', file=sys.stderr)
+
+    failed = cache.prefetch(birdtool.tile_server, missing, on_progress=report)
+    print(f'{len(tiles)} tiles cover {bbox} at zooms {min_zoom}-{max_zoom}; {len(missing)} were missing and {failed} could not be downloaded',
+          file=sys.stderr)
+    return(1 if failed else 0)
+
+if __name__ == '__main__':
+    sys.exit(main())
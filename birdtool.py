@@ -1,19 +1,468 @@
-import ebird.api as ebird
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from dotenv import load_dotenv, dotenv_values
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from collections import Counter, deque
+from array import array
+from urllib.parse import urlencode, quote
+import http.client
+import atexit
+import bisect
+import contextlib
+import difflib
+import functools
+import gzip
+import mmap
+import queue
+import struct
+import sys
+import zlib
+import urllib.error
+import urllib.request
+import threading
+import traceback
+import sqlite3
+import heapq
 import json
+import math
 import os
+import re
+import time
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is optional; aggregate_checklists falls back to plain Python without it
+    numpy = None
 
 load_dotenv('ebird_key.env')
 api_key = os.getenv('EBIRD_ACCESS')
 
+class Span():
+
+    '''Times the enclosed block and adds it to a profiler's totals under a name'''
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return(self)
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+# Handed out by disabled profilers; nullcontext can be entered any number of times
+no_span = contextlib.nullcontext()
+
+class Trace():
+
+    '''Breakdown of one hotspot click from the click to the rendered list \n
+    Stages are marked as the click passes through them; spans and counters are the change in the profiler's totals while it ran'''
+
+    def __init__(self, profiler, name):
+
+        self.profiler = profiler
+        self.name = name
+        self.started = time.perf_counter()
+        self.marks = {}
+        self.spans, self.counters = profiler.totals()
+
+    def mark(self, stage):
+        '''Records the time since the click at which a stage finished; later marks of a stage replace earlier ones'''
+        self.marks[stage] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def breakdown(self, **fields):
+
+        '''Returns the marks, and the spans and counters that changed since the trace started, as one dictionary \n
+        Span times are summed over every thread, so concurrent requests can add up to more than the click took'''
+
+        spans, counters = self.profiler.totals()
+        changed = {}
+        for name, (calls, seconds, _) in spans.items():
+            before = self.spans.get(name, (0, 0.0, 0.0))
+            if calls > before[0]:
+                changed[name] = {'calls': calls - before[0], 'ms': round((seconds - before[1]) * 1000, 1)}
+
+        return(dict({'trace': self.name,
+                     'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                     'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                     'marks': self.marks,
+                     'spans': changed,
+                     'counters': {name: count - self.counters.get(name, 0) for name, count in counters.items()
+                                  if count != self.counters.get(name, 0)}
+                     }, **fields))
+
+class Sampler():
+
+    '''Samples the stack of every thread at a fixed interval and counts each distinct stack \n
+    Covers the fetcher's worker threads as well as the Tk thread, which a cProfile run on one thread would miss'''
+
+    def __init__(self, path, interval: float = 0.005):
+
+        self.path = path
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='birdtool-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+
+        '''Takes samples until stopped'''
+
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+
+        '''Stops sampling and writes the counted stacks in the folded format flame graph tools read'''
+
+        self.stopped.set()
+        self.thread.join()
+        with open(self.path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+class Profiler():
+
+    '''Opt-in timing spans and counters for finding where a slow hotspot click spends its time \n
+    A disabled profiler hands out one shared no-op span and drops counts, so instrumented code only pays for the call'''
+
+    def __init__(self, enabled: bool = False, log_path=None, sample_path=None):
+
+        self.enabled = enabled
+        # Each finished trace is appended to the log as one JSON line
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        # Totals across every thread; each span holds its calls, seconds and longest call in seconds
+        self.spans = {}
+        self.counters = Counter()
+        self.traces = deque(maxlen=20)
+        self.sampler = Sampler(sample_path) if enabled and sample_path else None
+
+        if self.sampler is not None:
+            self.sampler.start()
+        if enabled:
+            atexit.register(self.close)
+
+    @classmethod
+    def from_environment(cls):
+
+        '''Creates the profiler described by environment variables \n
+        BIRDTOOL_PROFILE=1 turns on spans, counters and the per-click log in BIRDTOOL_PROFILE_LOG (profile_log.jsonl by default) \n
+        BIRDTOOL_PROFILE_SAMPLES=path also samples every thread's stack and writes the counts to path on exit'''
+
+        # Paths are resolved now so a later change of directory doesn't move the output
+        sample_path = os.path.abspath(os.environ['BIRDTOOL_PROFILE_SAMPLES']) if os.getenv('BIRDTOOL_PROFILE_SAMPLES') else None
+        enabled = os.getenv('BIRDTOOL_PROFILE', '0') not in ('', '0') or sample_path is not None
+        log_path = os.path.abspath(os.getenv('BIRDTOOL_PROFILE_LOG') or 'profile_log.jsonl')
+        return(cls(enabled, log_path, sample_path))
+
+    def span(self, name):
+        '''Returns a context manager that times the enclosed block under name'''
+        return(Span(self, name) if self.enabled else no_span)
+
+    def add(self, name, seconds):
+
+        '''Adds one timed call to a span's totals'''
+
+        with self.lock:
+            totals = self.spans.get(name)
+            if totals is None:
+                totals = self.spans[name] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    def count(self, name, amount: int = 1):
+        '''Adds to a counter when the profiler is enabled'''
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def totals(self):
+        '''Returns copies of the span totals and counters'''
+        with self.lock:
+            return({name: tuple(totals) for name, totals in self.spans.items()}, dict(self.counters))
+
+    def start_trace(self, name):
+        '''Starts a breakdown of one click, or returns None when the profiler is disabled'''
+        return(Trace(self, name) if self.enabled else None)
+
+    def finish_trace(self, trace, **fields):
+
+        '''Ends a trace, keeps its breakdown with the most recent ones and appends it to the log; returns the breakdown'''
+
+        breakdown = trace.breakdown(**fields)
+        with self.lock:
+            self.traces.append(breakdown)
+            if self.log_path is not None:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(breakdown) + '\n')
+        return(breakdown)
+
+    def report(self):
+
+        '''Returns every span's calls and total and longest times in milliseconds, and every counter'''
+
+        spans, counters = self.totals()
+        return({'spans': {name: {'calls': calls, 'ms': round(seconds * 1000, 1), 'max_ms': round(longest * 1000, 1)}
+                          for name, (calls, seconds, longest) in sorted(spans.items())},
+                'counters': dict(sorted(counters.items()))
+                })
+
+    def close(self):
+
+        '''Appends the process totals to the log and writes the stack samples; runs at exit when enabled'''
+
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(dict({'trace': 'totals', 'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
+                                        **self.report())) + '\n')
+        if self.sampler is not None:
+            self.sampler.stop()
+
+# Shared by birdtool and the app; instrumentation is off unless the environment turns it on
+profiler = Profiler.from_environment()
+
+class TokenBucket():
+
+    '''Paces callers to rate acquisitions per second on average while allowing bursts of up to burst \n
+    Callers reserve their slot under the lock and sleep outside it, so waiting threads are served in order'''
+
+    def __init__(self, rate: float = 8.0, burst: int = 16):
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        '''Adds the tokens earned since the last update; the lock must be held'''
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+
+        '''Takes a token, sleeping until one is available'''
+
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def hold(self, seconds):
+
+        '''Stops handing out tokens for a number of seconds, such as after the server asks callers to back off'''
+
+        with self.lock:
+            self.refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class EbirdClient():
+
+    '''Shared client for the eBird API calls birdtool makes, with the same signatures as the ebird.api functions \n
+    Requests are paced by a token bucket and sent over a pool of keep-alive connections \n
+    Identical requests already in flight are sent once and share the response'''
+
+    host = 'api.ebird.org'
+
+    def __init__(self, rate: float = 8.0, burst: int = 16, max_idle: int = 8, timeout: float = 30, connection_factory=http.client.HTTPSConnection):
+
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        # Swappable for http.client.HTTPConnection to talk to a local test server
+        self.connection_factory = connection_factory
+        self.max_idle = max_idle
+        self.idle = []
+        self.pool_lock = threading.Lock()
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def get_taxonomy(self, api_key):
+        return(self.call('taxonomy', '/v2/ref/taxonomy/ebird', api_key, {'fmt': 'json'}))
+
+    def get_hotspots(self, api_key, region, back=None):
+        params = {'fmt': 'json'} if back is None else {'fmt': 'json', 'back': back}
+        return(self.call('hotspots', f'/v2/ref/hotspot/{quote(region)}', api_key, params))
+
+    def get_visits(self, api_key, area, date=None, max_results=None):
+        path = f'/v2/product/lists/{quote(area)}' + (f'/{date.year}/{date.month}/{date.day}' if date is not None else '')
+        return(self.call('visits', path, api_key, {'maxResults': max_results} if max_results is not None else {}))
+
+    def get_checklist(self, api_key, sub_id):
+        return(self.call('checklist', f'/v2/product/checklist/view/{quote(sub_id)}', api_key))
+
+    def call(self, endpoint, path, api_key, params=None):
+
+        '''Returns the decoded response for a request, joining an identical request if one is already in flight'''
+
+        url = path + ('?' + urlencode(params) if params else '')
+        key = (url, api_key)
+
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+
+        if not leader:
+            self.record(endpoint, coalesced=True)
+            return(future.result())
+
+        try:
+            result = self.send(endpoint, url, api_key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+        return(result)
+
+    def send(self, endpoint, url, api_key):
+
+        '''Sends a GET request over a pooled connection and returns the decoded JSON body \n
+        Raises urllib.error.HTTPError for error statuses so callers can handle it like the ebird.api functions'''
+
+        headers = {'X-eBirdApiToken': api_key or '', 'Accept-Encoding': 'gzip'}
+
+        # A pooled connection the server has since closed fails on first use, so that attempt gets one retry on a new one
+        for attempt in range(2):
+            with profiler.span('ebird.throttle'):
+                self.bucket.acquire()
+            connection, reused = self.connection()
+            start = time.perf_counter()
+            try:
+                connection.request('GET', url, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                self.record(endpoint, time.perf_counter() - start, error=True)
+                raise ConnectionError(f'eBird request failed: {e}') from e
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                self.record(endpoint, time.perf_counter() - start, error=True)
+                # Keeps every network failure an OSError, which is what the fetcher's retries look for
+                raise ConnectionError(f'eBird request failed: {e}') from e
+            break
+
+        self.release(connection)
+        self.record(endpoint, time.perf_counter() - start, error=response.status >= 400)
+
+        if response.status == 429:
+            # Every request sharing this client backs off, not just the one that was throttled
+            retry_after = response.getheader('Retry-After', '')
+            self.bucket.hold(float(retry_after) if retry_after.isdigit() else 1.0)
+        if response.status >= 400:
+            raise urllib.error.HTTPError(f'https://{self.host}{url}', response.status, response.reason, response.headers, None)
+
+        with profiler.span('ebird.decode'):
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            return(json.loads(body))
+
+    def connection(self):
+
+        '''Returns an idle pooled connection, or a new one if none are idle, and whether it was reused'''
+
+        with self.pool_lock:
+            if self.idle:
+                return(self.idle.pop(), True)
+        return(self.connection_factory(self.host, timeout=self.timeout), False)
+
+    def release(self, connection):
+
+        '''Returns a connection to the pool, closing it if the pool is full'''
+
+        with self.pool_lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def record(self, endpoint, elapsed: float = 0.0, error: bool = False, coalesced: bool = False):
+
+        '''Adds a request to an endpoint's metrics'''
+
+        # Round trips also go to the profiler, so a click's breakdown shows its requests per endpoint
+        if profiler.enabled:
+            if coalesced:
+                profiler.count(f'ebird.{endpoint}.coalesced')
+            else:
+                profiler.add(f'ebird.{endpoint}', elapsed)
+
+        with self.stats_lock:
+            stats = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'coalesced': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            if coalesced:
+                stats['coalesced'] += 1
+                return
+            stats['requests'] += 1
+            stats['errors'] += error
+            stats['seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def metrics(self):
+
+        '''Returns request, error and coalesced counts with mean and max latency in milliseconds for each endpoint'''
+
+        with self.stats_lock:
+            return({endpoint: {'requests': stats['requests'],
+                               'errors': stats['errors'],
+                               'coalesced': stats['coalesced'],
+                               'mean_ms': round(stats['seconds'] / stats['requests'] * 1000, 1) if stats['requests'] else 0.0,
+                               'max_ms': round(stats['max_seconds'] * 1000, 1)
+                               } for endpoint, stats in self.stats.items()})
+
+# Every eBird request in the process goes through this client, so pacing and pooling are shared between the GUI, prefetcher and fetchers
+ebird_client = None
+ebird_client_lock = threading.Lock()
+
+def get_ebird_client():
+
+    '''Returns the process-wide eBird client, creating it on first use'''
+
+    global ebird_client
+
+    if ebird_client is None:
+        with ebird_client_lock:
+            if ebird_client is None:
+                ebird_client = EbirdClient()
+    return(ebird_client)
+
 def create_taxonomy_cache():
 
     '''Creates a taxonomy cache file for all bird species supported by eBird'''
 
     taxonomy_cache = {}
-    taxonomy = ebird.get_taxonomy(api_key)
+    taxonomy = get_ebird_client().get_taxonomy(api_key)
 
     for taxa in taxonomy:
         common_name = taxa.get('comName')
@@ -28,8 +477,9 @@ def create_hotspot_cache(region='US-VA', days_back: int = 14):
     '''Creates a hotspot cache file for all active hotspots within a region for a certain day range'''
 
     current_time = datetime.datetime.now()
-    cutoff = current_time - datetime.timedelta(days=days_back)
-    hotspots = ebird.get_hotspots(api_key, region, days_back)
+    # eBird dates are zero-padded, so they sort chronologically as strings and the cutoff needs no parsing
+    cutoff = (current_time - datetime.timedelta(days=days_back)).strftime('%Y-%m-%d %H:%M')
+    hotspots = get_ebird_client().get_hotspots(api_key, region, days_back)
 
     # Returns the relevant keys from an iterated hotspot in dictionary form
     def format_hotspot(hotspot):
@@ -42,14 +492,15 @@ def create_hotspot_cache(region='US-VA', days_back: int = 14):
     
     hotspot_cache = [
         format_hotspot(spot) for spot in hotspots
-        if datetime.datetime.strptime(spot.get('latestObsDt', '1970-1-1 0:00'), '%Y-%m-%d %H:%M') >= cutoff 
+        if spot.get('latestObsDt', '1970-01-01 00:00') >= cutoff
         ]
 
     return(hotspot_cache)
 
-def load_taxonomy():
+def load_taxonomy(offline: bool = False):
 
-    '''Loads or initializes the taxonomy cache'''
+    '''Loads or initializes the taxonomy cache \n
+    Offline callers keep using an expired cache instead of fetching a new one'''
 
     taxonomy_path = 'taxonomy_cache.json'
     taxonomy_cache = []
@@ -67,7 +518,7 @@ def load_taxonomy():
     cache_expiry_date = current_timestamp - (expiry_days * 86400)
 
     # If the cache file exists, but is past 'expiry', regenerate it and return file contents
-    if file_mod_time <= cache_expiry_date:
+    if file_mod_time <= cache_expiry_date and not offline:
         taxonomy_cache = create_taxonomy_cache()
         with open(taxonomy_path, 'w') as f:
             f.write(json.dumps(taxonomy_cache, indent=4))
@@ -76,119 +527,1915 @@ def load_taxonomy():
         with open(taxonomy_path, 'r') as f:
             return(json.load(f))
 
-# See comments on 'load_taxonomy' 
-def load_hotspots():
+class HotspotStore():
 
-    '''Loads or initializes the hotspot cache'''
-    
-    hotspot_path = 'hotspot_cache.json'
-    hotspot_cache = []
+    '''Read-only columnar view of a hotspot cache file \n
+    Coordinates and observation times are zero-copy arrays over the file contents; names and IDs are decoded on access'''
+
+    # Magic, format version, hotspot count and refresh time in minutes since the epoch; keeps the float columns 8-byte aligned
+    header = struct.Struct('<4sIII')
+    magic = b'BFHS'
+    version = 1
+    epoch = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, buffer):
+
+        self.buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count, refreshed = self.header.unpack_from(view)
+        if magic != self.magic or version != self.version:
+            raise ValueError('Not a hotspot store file or an unsupported version')
+
+        self.count = count
+        self.refreshed = self.epoch + datetime.timedelta(minutes=refreshed)
+        offset = self.header.size
+
+        # Each column is a slice of the buffer cast to its item type
+        def column(code, length):
+            nonlocal offset
+            size = array(code).itemsize * length
+            data = view[offset:offset + size].cast(code)
+            offset += size
+            return(data)
+
+        self.lat = column('d', count)
+        self.lng = column('d', count)
+        self.latest = column('q', count)
+        self.id_offsets = column('I', count + 1)
+        self.name_offsets = column('I', count + 1)
+        self.id_blob = view[offset:offset + self.id_offsets[count]]
+        offset += self.id_offsets[count]
+        self.name_blob = view[offset:offset + self.name_offsets[count]]
+
+    @classmethod
+    def open(cls, path, use_mmap: bool = False):
+
+        '''Opens a hotspot store file; memory mapping is optional since a mapped file can't be replaced on Windows'''
+
+        with open(path, 'rb') as f:
+            if use_mmap:
+                return(cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+            return(cls(f.read()))
+
+    @classmethod
+    def write(cls, path, hotspots, refreshed=None):
+
+        '''Writes a list of hotspot dictionaries to a hotspot store file, stamped as refreshed at refreshed or now \n
+        The file is replaced in one step so a stale copy can be read while a refresh writes the new one'''
+
+        ids = [spot.get('locId').encode() for spot in hotspots]
+        names = [spot.get('locName').encode() for spot in hotspots]
+
+        # Observation times are kept as whole minutes since the epoch
+        latest = array('q', [
+            (datetime.datetime.strptime(spot.get('latestObsDt', '1970-1-1 0:00'), '%Y-%m-%d %H:%M') - cls.epoch)
+            // datetime.timedelta(minutes=1)
+            for spot in hotspots
+            ])
+
+        def offsets(blobs):
+            result = array('I', [0])
+            for blob in blobs:
+                result.append(result[-1] + len(blob))
+            return(result)
+
+        with open(path + '.tmp', 'wb') as f:
+            stamp = cls.minutes_now() if refreshed is None else (refreshed - cls.epoch) // datetime.timedelta(minutes=1)
+            f.write(cls.header.pack(cls.magic, cls.version, len(hotspots), stamp))
+            f.write(array('d', [spot.get('lat') for spot in hotspots]).tobytes())
+            f.write(array('d', [spot.get('lng') for spot in hotspots]).tobytes())
+            f.write(latest.tobytes())
+            f.write(offsets(ids).tobytes())
+            f.write(offsets(names).tobytes())
+            f.write(b''.join(ids))
+            f.write(b''.join(names))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def minutes_now(cls):
+        '''Returns the current time in whole minutes since the epoch'''
+        return((datetime.datetime.now() - cls.epoch) // datetime.timedelta(minutes=1))
+
+    @classmethod
+    def mark_refreshed(cls, path):
+
+        '''Stamps a hotspot store file as refreshed now without rewriting its hotspots'''
+
+        with open(path, 'r+b') as f:
+            magic, version, count, _ = cls.header.unpack(f.read(cls.header.size))
+            f.seek(0)
+            f.write(cls.header.pack(magic, version, count, cls.minutes_now()))
+
+    def fingerprint(self):
+        '''Returns a checksum of the stored hotspots; the refresh time in the header is left out'''
+        return(zlib.crc32(memoryview(self.buffer)[self.header.size:]))
+
+    def __len__(self):
+        return(self.count)
+
+    def __getitem__(self, i):
+
+        '''Returns a hotspot as a dictionary with the same keys as the JSON hotspot cache'''
+
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return {'locName': self.loc_name(i),
+                'locId': self.loc_id(i),
+                'lat': self.lat[i],
+                'lng': self.lng[i],
+                'latestObsDt': self.latest_obs_dt(i)
+                }
+
+    def __iter__(self):
+        return(self[i] for i in range(self.count))
+
+    def loc_id(self, i):
+        '''Returns a hotspot's location ID; IDs are interned since they are used as dictionary keys'''
+        return(sys.intern(bytes(self.id_blob[self.id_offsets[i]:self.id_offsets[i + 1]]).decode()))
+
+    def loc_name(self, i):
+        '''Returns a hotspot's name'''
+        return(bytes(self.name_blob[self.name_offsets[i]:self.name_offsets[i + 1]]).decode())
+
+    def latest_obs_dt(self, i):
+        '''Returns a hotspot's latest observation time in the eBird date format'''
+        return((self.epoch + datetime.timedelta(minutes=self.latest[i])).strftime('%Y-%m-%d %H:%M'))
+
+def convert_hotspot_cache(json_path='hotspot_cache.json', store_path='hotspot_cache.bin'):
+
+    '''Converts a JSON hotspot cache into a hotspot store file \n
+    The store keeps the JSON file's modification time as its refresh time, so an old cache is still refreshed'''
+
+    refreshed = datetime.datetime.fromtimestamp(os.path.getmtime(json_path))
+    with open(json_path, 'r') as f:
+        HotspotStore.write(store_path, json.load(f), refreshed)
+
+class HotspotRegions():
+
+    '''Read-only view over the hotspot stores of several regions as one collection \n
+    A hotspot listed by more than one region keeps its first entry'''
+
+    def __init__(self, stores):
+
+        self.stores = stores
+        # The oldest refresh time stands in for every region's
+        self.refreshed = min((store.refreshed for store in stores), default=None)
+        self.store_index = array('H')
+        self.local_index = array('I')
+        self.lat = array('d')
+        self.lng = array('d')
+        seen = set()
+
+        for s, store in enumerate(stores):
+            for i in range(len(store)):
+                # A single region can't list a hotspot twice, so IDs are only decoded when regions may overlap
+                if len(stores) > 1:
+                    id = store.loc_id(i)
+                    if id in seen:
+                        continue
+                    seen.add(id)
+                self.store_index.append(s)
+                self.local_index.append(i)
+                self.lat.append(store.lat[i])
+                self.lng.append(store.lng[i])
+
+    def __len__(self):
+        return(len(self.local_index))
+
+    def __getitem__(self, i):
+        return(self.stores[self.store_index[i]][self.local_index[i]])
+
+    def __iter__(self):
+        return(self[i] for i in range(len(self)))
+
+    def fingerprint(self):
+        '''Returns a checksum over the fingerprints of every region's store'''
+        return(zlib.crc32(b''.join(store.fingerprint().to_bytes(4, 'little') for store in self.stores)))
+
+def hotspot_store_path(region):
+    '''Returns the hotspot store file for a region'''
+    return(f'hotspot_cache_{region}.bin')
+
+def refresh_hotspot_cache(region='US-VA', days_back: int = 14):
+
+    '''Merges the current list of active hotspots for a region into its hotspot store \n
+    New hotspots are added, latestObsDt is updated and hotspots inactive for days_back days are dropped \n
+    The store is only rewritten when its hotspots change; returns the refreshed store'''
+
+    hotspot_path = hotspot_store_path(region)
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=days_back)).strftime('%Y-%m-%d %H:%M')
+    existing = list(HotspotStore.open(hotspot_path)) if os.path.exists(hotspot_path) else []
+
+    merged = {spot['locId']: spot for spot in existing}
+    for spot in create_hotspot_cache(region, days_back):
+        merged[spot['locId']] = spot
+    hotspot_cache = [spot for spot in merged.values() if spot['latestObsDt'] >= cutoff]
+
+    # A region with no active hotspots has nothing to compare on its first fetch, and no file to stamp yet
+    if hotspot_cache == existing and os.path.exists(hotspot_path):
+        HotspotStore.mark_refreshed(hotspot_path)
+    else:
+        HotspotStore.write(hotspot_path, hotspot_cache)
+    return(HotspotStore.open(hotspot_path))
+
+def load_hotspot_store(region='US-VA', on_refresh=None):
+
+    '''Loads or initializes the hotspot store for a region \n
+    A stale store is returned at once while it is refreshed in the background; on_refresh(store) is called with the result \n
+    A store is only fetched in the foreground when the region has never been cached'''
+
+    hotspot_path = hotspot_store_path(region)
+    # Older versions kept a single JSON cache, which always held US-VA
+    json_path = 'hotspot_cache.json'
 
-    
     if not os.path.exists(hotspot_path):
-        hotspot_cache = create_hotspot_cache()
-        with open(hotspot_path, 'w') as f:
-            f.write(json.dumps(hotspot_cache, indent=4))
-            return(hotspot_cache)
-        
-    current_timestamp = datetime.datetime.now().timestamp()
-    file_mod_time = os.path.getmtime(hotspot_path)
+        if region == 'US-VA' and os.path.exists(json_path):
+            convert_hotspot_cache(json_path, hotspot_path)
+        else:
+            return(refresh_hotspot_cache(region))
+
+    store = HotspotStore.open(hotspot_path)
     expiry_days = 1
-    cache_expiry_date = current_timestamp - (expiry_days * 86400)
 
-    if file_mod_time <= cache_expiry_date:
-        hotspot_cache = create_hotspot_cache()
-        with open(hotspot_path, 'w') as f:
-            f.write(json.dumps(hotspot_cache, indent=4))
-            return(hotspot_cache)
-    else:
-        with open(hotspot_path, 'r') as f:
-            return(json.load(f))
+    if datetime.datetime.now() - store.refreshed >= datetime.timedelta(days=expiry_days):
+        def refresh():
+            try:
+                refreshed = refresh_hotspot_cache(region)
+            except OSError:
+                # Keeps serving the stale store until the next launch tries again
+                return
+            if on_refresh is not None:
+                on_refresh(refreshed)
 
-@dataclass
-class ObservationData:
-    species_code: str = ''
-    common_name: str = ''
-    num_obs: any = 0
-    time_since: int = 0
-    checklist_count: int = 0
+        threading.Thread(target=refresh, daemon=True).start()
 
-    def update_observation(self, new_time, new_count):
-        '''Updates an observation entry with the earliest data and keeps a record of individual sightings'''
-        if new_time < self.time_since:
-            self.time_since = new_time
-            self.num_obs = new_count
-        self.checklist_count += 1
+    return(store)
 
-class BirdDataHandler():
+# See comments on 'load_taxonomy' 
+def load_hotspots(regions=('US-VA',), on_refresh=None):
 
-    def __init__(self, api_key, location, days_back: int = 14):
+    '''Loads or initializes the hotspot caches for one or more regions as one collection \n
+    Stale regions are refreshed in the background; on_refresh(hotspots) is called with the updated collection'''
 
-        self.api_key = api_key
-        self.taxonomy = load_taxonomy()
-        self.current_time = datetime.datetime.now()
-        self.location = location
-        self.days_back = days_back
-        self.bird_dict = {}
+    stores = {}
+    stores_lock = threading.Lock()
 
-    def gather_checklists(self):
+    # Each background refresh rebuilds the collection from the newest store of every region
+    def region_refreshed(region, store):
+        with stores_lock:
+            stores[region] = store
+            hotspots = HotspotRegions(list(stores.values()))
+        if on_refresh is not None:
+            on_refresh(hotspots)
 
-        '''Gathers checklist codes from visits to a location within 14 days'''
+    for region in regions:
+        store = load_hotspot_store(region, on_refresh=lambda store, region=region: region_refreshed(region, store))
+        with stores_lock:
+            stores.setdefault(region, store)
 
-        codes = []
-        checklists = []
+    with stores_lock:
+        return(HotspotRegions(list(stores.values())))
 
-        if self.days_back > 14:
-            return []
-        
-        for d in range(0, self.days_back):
-            day_iter = self.current_time - datetime.timedelta(d)
-            visits = ebird.get_visits(self.api_key, self.location, date=day_iter, max_results=100)
-
-            for v in visits:
-                visit_key = v.get('subId')
-                codes.append(visit_key)
-        
-        for code in codes:
-            checklist = ebird.get_checklist(self.api_key, code)
-            checklists.append(checklist)
+class HotspotGrid():
 
-        return(checklists)
-    
-    def sort_observations(self):
+    '''Uniform grid index over hotspot coordinates for fast bounding box lookups \n
+    Works over a list of hotspot dictionaries or a HotspotStore; cells only hold positions'''
 
-        '''Gathers observation data from checklists and formats it into ObservationData objects \n
-        Returns a dictionary of formatted observations sorted alphabetically by common name'''
+    def __init__(self, hotspots, cell_size: float = 0.1):
 
-        # Clear bird dict if the method has already been called in an instance
-        if self.bird_dict:
-            self.bird_dict = {}
+        self.hotspots = hotspots
+        self.cell_size = cell_size
+        self.cells = {}
 
-        checklists = self.gather_checklists()
+        # A store's coordinate columns are used directly instead of building every hotspot dictionary
+        if isinstance(hotspots, (HotspotStore, HotspotRegions)):
+            self.lats, self.lngs = hotspots.lat, hotspots.lng
+        else:
+            self.lats = [spot.get('lat') for spot in hotspots]
+            self.lngs = [spot.get('lng') for spot in hotspots]
 
-        for data in checklists:
-            observations = data.get('obs')
-
-            for obs in observations:
-                obs_code = obs.get('speciesCode')
-                # Get the time since as a number of seconds; enchances precision of observation updates
-                obs_timesince = int((self.current_time - datetime.datetime.strptime(obs.get('obsDt'), '%Y-%m-%d %H:%M')).total_seconds())
-                obs_count = int(obs.get('howManyStr')) if obs.get('howManyStr').isdigit() else str('X')
-
-                if obs_code in self.bird_dict:
-                    self.bird_dict.get(obs_code).update_observation(new_time=obs_timesince, new_count=obs_count)
-                else:    
-                    if obs_code in self.taxonomy:
-                        common_name = self.taxonomy[obs_code]
-                    else:
-                        return[]
-                    
-                    self.bird_dict[obs_code] = ObservationData(obs_code, common_name, obs_count, obs_timesince, 1)
+        for i in range(len(hotspots)):
+            self.cells.setdefault(self.cell(self.lats[i], self.lngs[i]), array('I')).append(i)
 
-        # Converts the time_since attribute back to days; seconds are initially used for accurate sight comparisons
-        for t in self.bird_dict.values():
-            t.time_since = int(t.time_since // 86400)
-            
-        # Format observations alphabetically by ObservationData class common name attribute
-        self.bird_dict = dict(sorted(self.bird_dict.items(), key=lambda item: item[1].common_name))
-        return(self.bird_dict)
+    def cell(self, lat, lng):
+        '''Returns the (row, column) grid cell containing a coordinate'''
+        return((int(lat // self.cell_size), int(lng // self.cell_size)))
+
+    def query(self, south, west, north, east):
+
+        '''Returns the hotspots inside a bounding box'''
+
+        min_row, min_col = self.cell(south, west)
+        max_row, max_col = self.cell(north, east)
+
+        # Wide boxes cover more cells than are occupied, so only the occupied ones are checked
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            cells = [members for (row, col), members in self.cells.items()
+                     if min_row <= row <= max_row and min_col <= col <= max_col]
+        else:
+            cells = [self.cells[(row, col)] for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)
+                     if (row, col) in self.cells]
+
+        return([self.hotspots[i] for members in cells for i in members
+                if south <= self.lats[i] <= north and west <= self.lngs[i] <= east])
+
+def distance_km(lat1, lng1, lat2, lng2):
+
+    '''Returns the approximate distance in kilometers between two coordinates; accurate at map view scales'''
+
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return(6371 * math.hypot(x, y))
+
+def mercator_pixels(lat, lng, zoom):
+
+    '''Converts a coordinate to web mercator pixel coordinates at a zoom level'''
+
+    size = 256 * (2 ** zoom)
+    x = (lng + 180) / 360 * size
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * size
+    return(x, y)
+
+def create_cluster_cache(hotspots, max_zoom: int = 11, cell_size: int = 80):
+
+    '''Groups hotspots into clusters of cell_size pixel squares for every zoom level up to max_zoom \n
+    Cells halve in pixel size with each zoom level out, so each level is built by merging the one below'''
+
+    # Merges two partial clusters; lat/lng are kept as sums until the level is formatted
+    def merge_cluster(a, b):
+        return {'count': a['count'] + b['count'],
+                'lat': a['lat'] + b['lat'],
+                'lng': a['lng'] + b['lng'],
+                'south': min(a['south'], b['south']),
+                'west': min(a['west'], b['west']),
+                'north': max(a['north'], b['north']),
+                'east': max(a['east'], b['east']),
+                'locName': None
+                }
+
+    level = {}
+    for spot in hotspots:
+        lat, lng = spot.get('lat'), spot.get('lng')
+        x, y = mercator_pixels(lat, lng, max_zoom)
+        key = (int(x // cell_size), int(y // cell_size))
+        cluster = {'count': 1, 'lat': lat, 'lng': lng, 'south': lat, 'west': lng, 'north': lat, 'east': lng,
+                   'locName': spot.get('locName')}
+        level[key] = merge_cluster(level[key], cluster) if key in level else cluster
+
+    cluster_cache = {}
+    for zoom in range(max_zoom, -1, -1):
+        cluster_cache[str(zoom)] = [
+            dict(cluster, clusterId=f'{zoom}-{i}', lat=cluster['lat'] / cluster['count'], lng=cluster['lng'] / cluster['count'])
+            for i, cluster in enumerate(level.values())
+            ]
+
+        parent = {}
+        for (x, y), cluster in level.items():
+            key = (x // 2, y // 2)
+            parent[key] = merge_cluster(parent[key], cluster) if key in parent else cluster
+        level = parent
+
+    return(cluster_cache)
+
+class ClusterPyramid():
+
+    '''Per zoom level spatial indexes over a cluster cache'''
+
+    def __init__(self, cluster_cache):
+
+        self.max_zoom = max(int(zoom) for zoom in cluster_cache)
+        self.levels = {int(zoom): HotspotGrid(clusters) for zoom, clusters in cluster_cache.items()}
+
+    def query(self, zoom, south, west, north, east):
+
+        '''Returns the clusters at the level nearest a map zoom inside a bounding box'''
+
+        level = min(max(round(zoom), 0), self.max_zoom)
+        return(self.levels[level].query(south, west, north, east))
+
+def load_clusters(hotspots):
+
+    '''Loads or rebuilds the cluster cache; it's rebuilt whenever the hotspots it was built from change'''
+
+    cluster_path = 'cluster_cache.json'
+    fingerprint = hotspots.fingerprint()
+
+    if os.path.exists(cluster_path):
+        with open(cluster_path, 'r') as f:
+            cluster_cache = json.load(f)
+        if cluster_cache.get('fingerprint') == fingerprint:
+            return(ClusterPyramid(cluster_cache['levels']))
+
+    cluster_cache = create_cluster_cache(hotspots)
+    with open(cluster_path, 'w') as f:
+        f.write(json.dumps({'fingerprint': fingerprint, 'levels': cluster_cache}, indent=4))
+    return(ClusterPyramid(cluster_cache))
+
+def normalize_name(name):
+
+    '''Normalizes a common name for matching; ignores case, punctuation and extra spacing'''
+
+    name = name.casefold().replace('-', ' ')
+    name = re.sub(r"[^\w\s]", '', name)
+    return(' '.join(name.split()))
+
+class NameSearchIndex():
+
+    '''Search index over a list of names; ids returned by searches are positions in that list \n
+    Supports prefix matching on word starts, substring matching and fuzzy matching on shared trigrams'''
+
+    def __init__(self, names):
+
+        self.names = [normalize_name(name) for name in names]
+        self.trigrams = {}
+        # Results for one and two letter queries are built on first use since they can't use trigrams
+        self.short_results = {}
+
+        for i, name in enumerate(self.names):
+            for j in range(len(name) - 2):
+                self.trigrams.setdefault(name[j:j + 3], set()).add(i)
+
+        self.words = sorted((word, i) for i, name in enumerate(self.names) for word in name.split())
+        self.word_keys = [word for word, i in self.words]
+
+    def prefix(self, query):
+
+        '''Returns the ids of names with a word starting with the query; a query of several words must start on consecutive words'''
+
+        query = normalize_name(query)
+        first = query.split(' ', 1)[0]
+        start = bisect.bisect_left(self.word_keys, first)
+        end = bisect.bisect_left(self.word_keys, first + '\uffff')
+        matches = {i for word, i in self.words[start:end]}
+        if ' ' in query:
+            matches = {i for i in matches if ' ' + query in ' ' + self.names[i]}
+        return(matches)
+
+    def substring(self, query):
+
+        '''Returns the ids of names containing the query'''
+
+        query = normalize_name(query)
+
+        if len(query) < 3:
+            if query not in self.short_results:
+                self.short_results[query] = {i for i, name in enumerate(self.names) if query in name}
+            return(self.short_results[query])
+
+        # Any name containing the query contains all of its trigrams; the smallest sets are intersected first
+        postings = sorted((self.trigrams.get(query[j:j + 3], set()) for j in range(len(query) - 2)), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates = candidates & posting
+        return({i for i in candidates if query in self.names[i]})
+
+    def fuzzy(self, query, threshold: float = 0.5, limit: int = 50):
+
+        '''Returns the ids of up to limit names sharing at least threshold of the query's trigrams, best matches first \n
+        Ties go to the shorter name, so a query closer to the whole name wins'''
+
+        query = normalize_name(query)
+        query_trigrams = {query[j:j + 3] for j in range(len(query) - 2)}
+        if not query_trigrams:
+            return([])
+
+        postings = sorted((self.trigrams.get(trigram, ()) for trigram in query_trigrams), key=len)
+        # Trigrams in over a quarter of the names, like the endings of 'throated', hardly tell names apart and are left out
+        most = len(self.names) // 4
+        if len(postings[0]) <= most:
+            postings = [posting for posting in postings if len(posting) <= most]
+        minimum = math.ceil(threshold * len(postings))
+        # A name sharing minimum trigrams must share one of the rarest len - minimum + 1, so only those are counted over whole postings
+        rare = len(postings) - minimum + 1
+        scores = Counter()
+        for posting in postings[:rare]:
+            scores.update(posting)
+
+        # The remaining trigrams are only looked up for those names, which keeps the counting in C
+        candidates = set(scores)
+        for posting in postings[rare:]:
+            scores.update(candidates.intersection(posting))
+        candidates = [(score, -len(self.names[i]), -i) for i, score in scores.items() if score >= minimum]
+        return([-i for score, length, i in heapq.nlargest(limit, candidates)])
+
+    def search(self, query):
+
+        '''Returns the ids of names matching the query as a substring, falling back to fuzzy matches, best matches first \n
+        Substring matches on a word start come before the rest, each in list order; an empty query matches every name'''
+
+        if not normalize_name(query):
+            return(list(range(len(self.names))))
+
+        matches = self.substring(query)
+        if not matches:
+            return(self.fuzzy(query))
+        starts = self.prefix(query) & matches
+        return(sorted(starts) + sorted(matches - starts))
+
+class Geocoder():
+
+    '''Resolves place names to coordinates through a persistent cache in front of OpenStreetMap's Nominatim service \n
+    Queries are normalized before lookup and a cached query differing only by typos is reused \n
+    Hotspot names resolve from the hotspot cache without a request, which also covers lookups while offline'''
+
+    url = 'https://nominatim.openstreetmap.org/search'
+
+    def __init__(self, path='geocode_cache.json', timeout: float = 10):
+
+        self.path = path
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # Nominatim's usage policy allows one request per second
+        self.bucket = TokenBucket(rate=1.0, burst=1)
+        self.hotspots = None
+        self.hotspot_names = None
+        self.hotspot_index = None
+        self.hotspot_lengths = None
+
+        self.cache = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.cache = json.load(f)
+
+    def set_hotspots(self, hotspots):
+        '''Sets the hotspots whose names are resolved locally; the name table and search index are built on first use'''
+        with self.lock:
+            self.hotspots = hotspots
+            self.hotspot_names = None
+            self.hotspot_index = None
+            self.hotspot_lengths = None
+
+    def local(self, query):
+
+        '''Returns a place for a query from the cache, an exact hotspot name or a cached near miss without any request \n
+        Places are dictionaries with lat, lng, bbox as (south, west, north, east) or None, name and source'''
+
+        key = normalize_name(query)
+        if not key:
+            return(None)
+
+        place = self.cached(key)
+        if place is None:
+            place = self.gazetteer(key, exact=True)
+        if place is None:
+            place = self.similar(key)
+        return(place)
+
+    def lookup(self, query):
+
+        '''Returns a place for a query, asking Nominatim when it can't be resolved locally \n
+        Falls back to the closest hotspot name when Nominatim finds nothing or can't be reached; returns None if that fails too'''
+
+        place = self.local(query)
+        key = normalize_name(query)
+        if place is None and key:
+            place = self.request(query)
+            if place is not None:
+                self.store(key, place)
+            else:
+                place = self.gazetteer(key, exact=False)
+        return(place)
+
+    def cached(self, key):
+        '''Returns the cached place for a normalized query, or None'''
+        with self.lock:
+            place = self.cache.get(key)
+        return(dict(place, source='cache') if place is not None else None)
+
+    def similar(self, key):
+
+        '''Returns the cached place for an earlier query that matches word for word apart from typos \n
+        Words of three letters or less must match exactly, so a query for Richmond VA never reuses Richmond CA'''
+
+        words = key.split()
+        with self.lock:
+            candidates = difflib.get_close_matches(key, list(self.cache), n=5, cutoff=0.85)
+            for candidate in candidates:
+                candidate_words = candidate.split()
+                if len(candidate_words) == len(words) and all(
+                        a == b or (min(len(a), len(b)) > 3 and difflib.SequenceMatcher(None, a, b).ratio() >= 0.8)
+                        for a, b in zip(words, candidate_words)):
+                    return(dict(self.cache[candidate], source='cache'))
+        return(None)
+
+    def gazetteer(self, key, exact: bool = True):
+
+        '''Returns the hotspot whose name matches a normalized query as a place, or None \n
+        Exact matching ignores a trailing county in parentheses; otherwise the shortest name containing the query, then the closest fuzzy match, is used'''
+
+        with self.lock:
+            hotspots = self.hotspots
+            if hotspots is None:
+                return(None)
+            # Exact lookups run on the interface thread, so they only build the name table
+            if self.hotspot_names is None:
+                self.hotspot_names = {}
+                self.hotspot_lengths = []
+                for i, spot in enumerate(hotspots):
+                    short_name = normalize_name(re.sub(r'\s*\([^)]*\)$', '', spot['locName']))
+                    self.hotspot_names.setdefault(short_name, i)
+                    self.hotspot_names.setdefault(normalize_name(spot['locName']), i)
+                    self.hotspot_lengths.append(len(short_name))
+            # The trigram index is only needed by the fallback, which lookup calls off the interface thread
+            if not exact and self.hotspot_index is None:
+                self.hotspot_index = NameSearchIndex([spot['locName'] for spot in hotspots])
+            names, index, lengths = self.hotspot_names, self.hotspot_index, self.hotspot_lengths
+
+        if exact:
+            match = names.get(key)
+        else:
+            matches = index.substring(key)
+            if matches:
+                match = min(matches, key=lambda i: lengths[i])
+            else:
+                match = next(iter(index.fuzzy(key)), None)
+        if match is None:
+            return(None)
+
+        spot = hotspots[match]
+        return({'lat': spot['lat'], 'lng': spot['lng'], 'bbox': None, 'name': spot['locName'], 'source': 'hotspot'})
+
+    def request(self, query):
+
+        '''Looks a query up with Nominatim; returns None if it finds nothing or can't be reached'''
+
+        self.bucket.acquire()
+        url = self.url + '?' + urlencode({'q': query, 'format': 'jsonv2', 'limit': 1})
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': 'BirdTracker/1.0'}), timeout=self.timeout) as response:
+                results = json.load(response)
+        except (OSError, ValueError):
+            return(None)
+        if not results:
+            return(None)
+
+        result = results[0]
+        # Nominatim orders bounding boxes as south, north, west, east
+        south, north, west, east = (float(edge) for edge in result['boundingbox']) if result.get('boundingbox') else (None,) * 4
+        return({'lat': float(result['lat']), 'lng': float(result['lon']),
+                'bbox': (south, west, north, east) if south is not None else None,
+                'name': result.get('display_name', query), 'source': 'nominatim'})
+
+    def store(self, key, place):
+
+        '''Adds a place to the cache and rewrites the cache file'''
+
+        with self.lock:
+            self.cache[key] = {name: place[name] for name in ('lat', 'lng', 'bbox', 'name')}
+            # Written to a temporary file first so a crash can't leave a torn cache
+            with open(self.path + '.tmp', 'w') as f:
+                f.write(json.dumps(self.cache, indent=4))
+            os.replace(self.path + '.tmp', self.path)
+
+geocoder = None
+geocoder_lock = threading.Lock()
+
+def get_geocoder():
+
+    '''Returns the process-wide geocoder, loading its cache file on first use'''
+
+    global geocoder
+
+    if geocoder is None:
+        with geocoder_lock:
+            if geocoder is None:
+                geocoder = Geocoder()
+    return(geocoder)
+
+class TaxonomyIndex():
+
+    '''Lookup table over the taxonomy cache by species code or by normalized common name'''
+
+    def __init__(self, taxonomy):
+
+        self.by_code = taxonomy
+        self.by_name = {normalize_name(name): code for code, name in taxonomy.items()}
+        self.search_index = None
+
+    def __contains__(self, species_code):
+        return(species_code in self.by_code)
+
+    def __getitem__(self, species_code):
+        return(self.by_code[species_code])
+
+    def __len__(self):
+        return(len(self.by_code))
+
+    def common_name(self, species_code):
+        '''Returns the common name for a species code, or None if it is not in the taxonomy'''
+        return(self.by_code.get(species_code))
+
+    def species_code(self, common_name):
+        '''Returns the species code for a common name, or None if it is not in the taxonomy'''
+        return(self.by_name.get(normalize_name(common_name)))
+
+    def search(self, query):
+
+        '''Returns the species codes whose common names match a query; the search index is built on first use'''
+
+        if self.search_index is None:
+            self.codes = list(self.by_code)
+            self.search_index = NameSearchIndex(self.by_code.values())
+        return([self.codes[i] for i in self.search_index.search(query)])
+
+# Shared by every BirdDataHandler so the taxonomy cache is only parsed once per process
+taxonomy_index = None
+taxonomy_lock = threading.Lock()
+
+def get_taxonomy_index():
+
+    '''Returns the process-wide taxonomy index, loading the taxonomy cache on first use'''
+
+    global taxonomy_index
+
+    if taxonomy_index is None:
+        with taxonomy_lock:
+            # Another thread may have finished loading while this one waited on the lock
+            if taxonomy_index is None:
+                taxonomy_index = TaxonomyIndex(load_taxonomy())
+    return(taxonomy_index)
+
+# Slotted so region-wide aggregations don't carry a __dict__ per species
+@dataclass(slots=True)
+class ObservationData:
+    species_code: str = ''
+    common_name: str = ''
+    num_obs: any = 0
+    time_since: int = 0
+    checklist_count: int = 0
+
+    def update_observation(self, new_time, new_count):
+        '''Updates an observation entry with the earliest data and keeps a record of individual sightings'''
+        if new_time < self.time_since:
+            self.time_since = new_time
+            self.num_obs = new_count
+        self.checklist_count += 1
+
+    def as_dict(self):
+        '''Returns the observation as a plain dictionary for the display frames'''
+        return({'species_code': self.species_code, 'common_name': self.common_name, 'num_obs': self.num_obs,
+                'time_since': self.time_since, 'checklist_count': self.checklist_count})
+
+@functools.lru_cache(maxsize=8192)
+def parse_obs_dt(obs_dt):
+
+    '''Parses an eBird observation time string \n
+    Cached since every observation on a checklist shares its obsDt, as do checklists from the same outing'''
+
+    return(datetime.datetime.strptime(obs_dt, '%Y-%m-%d %H:%M'))
+
+def parse_count(how_many):
+
+    '''Returns an observation count as an int, or 'X' for species only marked as present'''
+
+    return(int(how_many) if how_many.isdigit() else 'X')
+
+def parse_checklists(checklists, reference_time):
+
+    '''Flattens a batch of checklists into parallel species code, seconds before reference_time and count columns \n
+    Counts of 'X' are stored as -1 so the columns are plain integer arrays'''
+
+    codes = []
+    seconds = array('q')
+    counts = array('q')
+    offsets = {}
+
+    for data in checklists:
+        for obs in data.get('obs'):
+            obs_dt = obs.get('obsDt')
+            # Each distinct time string is parsed and subtracted once per batch
+            offset = offsets.get(obs_dt)
+            if offset is None:
+                offset = offsets[obs_dt] = int((reference_time - parse_obs_dt(obs_dt)).total_seconds())
+            how_many = obs.get('howManyStr')
+            codes.append(obs.get('speciesCode'))
+            seconds.append(offset)
+            counts.append(int(how_many) if how_many.isdigit() else -1)
+
+    return(codes, seconds, counts)
+
+def aggregate_checklists(checklists, reference_time, taxonomy, use_numpy=None, strict: bool = True):
+
+    '''Aggregates a batch of checklists into ObservationData keyed by species code, keeping time_since in seconds \n
+    Returns None if a species is missing from the taxonomy, or leaves those species out when strict is False \n
+    Uses NumPy when it is installed unless use_numpy is False'''
+
+    codes, seconds, counts = parse_checklists(checklists, reference_time)
+
+    if not strict and any(code not in taxonomy for code in set(codes)):
+        keep = [i for i, code in enumerate(codes) if code in taxonomy]
+        codes = [codes[i] for i in keep]
+        seconds = array('q', (seconds[i] for i in keep))
+        counts = array('q', (counts[i] for i in keep))
+
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy and codes:
+        return(aggregate_columns(codes, seconds, counts, taxonomy))
+
+    bird_dict = {}
+    for obs_code, obs_timesince, obs_count in zip(codes, seconds, counts):
+        obs_count = obs_count if obs_count >= 0 else 'X'
+        if obs_code in bird_dict:
+            bird_dict[obs_code].update_observation(new_time=obs_timesince, new_count=obs_count)
+        elif obs_code in taxonomy:
+            bird_dict[obs_code] = ObservationData(obs_code, taxonomy[obs_code], obs_count, obs_timesince, 1)
+        else:
+            return(None)
+    return(bird_dict)
+
+def aggregate_columns(codes, seconds, counts, taxonomy):
+
+    '''NumPy version of aggregate_checklists working on the columns from parse_checklists \n
+    Finds every species' latest sighting, its count and its checklist count with one sort and one bincount'''
+
+    ids = {}
+    species = numpy.fromiter((ids.setdefault(code, len(ids)) for code in codes), dtype=numpy.int64, count=len(codes))
+    if any(code not in taxonomy for code in ids):
+        return(None)
+
+    times = numpy.frombuffer(seconds, dtype=numpy.int64)
+    amounts = numpy.frombuffer(counts, dtype=numpy.int64)
+
+    # Sorted by species then time, each species' run starts with its latest sighting; the sort is stable, so ties keep checklist order
+    order = numpy.lexsort((times, species))
+    latest = order[numpy.searchsorted(species[order], numpy.arange(len(ids)))]
+    checklist_counts = numpy.bincount(species, minlength=len(ids))
+
+    bird_dict = {}
+    for code, i in ids.items():
+        first = latest[i]
+        count = int(amounts[first])
+        bird_dict[code] = ObservationData(code, taxonomy[code], count if count >= 0 else 'X', int(times[first]), int(checklist_counts[i]))
+    return(bird_dict)
+
+class ChecklistCache():
+
+    '''Persistent SQLite store of eBird checklists keyed by subId \n
+    Submitted checklists don't change, so stored entries are served without a network request'''
+
+    def __init__(self, path='checklist_cache.db', max_entries: int = 50000, max_age_days: int = 30, visit_ttl: int = 900):
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        # Visit lists can still gain late submissions, so they are only reused for visit_ttl seconds
+        self.visit_ttl = visit_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # A single connection is shared by the fetcher's worker threads and guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS checklists (sub_id TEXT PRIMARY KEY, stored_at REAL, body TEXT)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS checklists_stored_at ON checklists (stored_at)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS visits (location TEXT, day TEXT, stored_at REAL, body TEXT, '
+                                'PRIMARY KEY (location, day))')
+        self.connection.commit()
+        self.evict()
+
+    def get(self, sub_id):
+
+        '''Returns a stored checklist, or None if the subId has not been cached'''
+
+        with self.lock:
+            row = self.connection.execute('SELECT body FROM checklists WHERE sub_id = ?', (sub_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                profiler.count('checklist_cache.miss')
+                return(None)
+            self.hits += 1
+        profiler.count('checklist_cache.hit')
+        return(json.loads(row[0]))
+
+    def put(self, sub_id, checklist):
+
+        '''Stores a checklist and evicts the oldest entries once the cache is over its size limit'''
+
+        body = json.dumps(checklist)
+        with self.lock:
+            # Only new subIds add to the size; a checklist stored again just replaces its row
+            added = self.connection.execute('INSERT OR IGNORE INTO checklists VALUES (?, ?, ?)', (sub_id, time.time(), body)).rowcount
+            if not added:
+                self.connection.execute('UPDATE checklists SET stored_at = ?, body = ? WHERE sub_id = ?', (time.time(), body, sub_id))
+            self.connection.commit()
+            self.size += added
+        if self.size > self.max_entries:
+            self.evict()
+
+    def get_visits(self, location, day, stale: bool = False):
+
+        '''Returns a location's visit list for a day if it was stored within visit_ttl seconds \n
+        Older lists are kept until max_age_days for offline runs, which pass stale=True to accept them'''
+
+        stored_after = 0 if stale else time.time() - self.visit_ttl
+        with self.lock:
+            row = self.connection.execute('SELECT body FROM visits WHERE location = ? AND day = ? AND stored_at >= ?',
+                                          (location, day.strftime('%Y-%m-%d'), stored_after)).fetchone()
+        if row is None:
+            profiler.count('visit_cache.miss')
+            return(None)
+        profiler.count('visit_cache.hit')
+        return(json.loads(row[0]))
+
+    def put_visits(self, location, day, visits):
+
+        '''Stores a location's visit list for a day'''
+
+        body = json.dumps(visits)
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO visits VALUES (?, ?, ?, ?)',
+                                    (location, day.strftime('%Y-%m-%d'), time.time(), body))
+            self.connection.commit()
+
+    def evict(self):
+
+        '''Removes entries older than max_age_days, then the oldest entries until a cache over max_entries is at 90 percent of it'''
+
+        cutoff = time.time() - (self.max_age_days * 86400)
+        with self.lock:
+            self.connection.execute('DELETE FROM checklists WHERE stored_at < ?', (cutoff,))
+            self.connection.execute('DELETE FROM visits WHERE stored_at < ?', (cutoff,))
+            self.size = self.connection.execute('SELECT COUNT(*) FROM checklists').fetchone()[0]
+            # Trimming below the limit leaves room for the next puts, so a full cache isn't scanned on every insert
+            if self.size > self.max_entries:
+                self.connection.execute('DELETE FROM checklists WHERE sub_id IN '
+                                        '(SELECT sub_id FROM checklists ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                                        (int(self.max_entries * 0.9),))
+                self.size = self.connection.execute('SELECT COUNT(*) FROM checklists').fetchone()[0]
+            self.connection.commit()
+
+    def stats(self):
+        '''Returns the hit/miss counters and the number of stored checklists'''
+        return({'hits': self.hits, 'misses': self.misses, 'entries': self.size})
+
+# Shared by every ChecklistFetcher that isn't given its own cache; stored beside the hotspot cache
+checklist_cache = None
+checklist_cache_lock = threading.Lock()
+
+def get_checklist_cache():
+
+    '''Returns the process-wide checklist cache, opening the cache file on first use'''
+
+    global checklist_cache
+
+    if checklist_cache is None:
+        with checklist_cache_lock:
+            if checklist_cache is None:
+                checklist_cache = ChecklistCache()
+    return(checklist_cache)
+
+# Tile server the map draws from; tiles are cached under this URL
+tile_server = 'https://mt0.google.com/vt/lyrs=m&hl=en&x={x}&y={y}&z={z}&s=Ga'
+
+class TileCache():
+
+    '''Persistent SQLite store of map tile images, laid out like an MBTiles tiles table but keyed by server and XYZ tile numbers \n
+    Once over max_bytes, the least recently used tiles are evicted down to 90 percent of it'''
+
+    def __init__(self, path='tile_cache.db', max_bytes: int = 256 * 1024 * 1024, timeout: float = 10):
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Hits only need their use time bumped for eviction, so the updates are written in batches
+        self.touched = {}
+        # Counts not yet added to the counters table, which keeps totals across runs
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+        # Shared by the map's tile loading threads and guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tiles (server TEXT, zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, '
+                                'tile_data BLOB, last_used REAL, PRIMARY KEY (server, zoom_level, tile_column, tile_row))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tiles_last_used ON tiles (last_used)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+        self.connection.commit()
+        self.size = self.connection.execute('SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM tiles').fetchone()[0]
+
+    def get(self, server, zoom, x, y):
+
+        '''Returns a stored tile image, or None if the tile has not been cached'''
+
+        key = (server, zoom, x, y)
+        with self.lock:
+            row = self.connection.execute('SELECT tile_data FROM tiles WHERE server = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                          key).fetchone()
+            if row is None:
+                self.misses += 1
+                self.pending['misses'] += 1
+                profiler.count('tile_cache.miss')
+            else:
+                self.hits += 1
+                self.pending['hits'] += 1
+                profiler.count('tile_cache.hit')
+                self.touched[key] = time.time()
+            if len(self.touched) + self.pending.total() >= 64:
+                self.flush()
+        return(row[0] if row is not None else None)
+
+    def put(self, server, zoom, x, y, data):
+
+        '''Stores a tile image and evicts the least recently used tiles once the cache is over its size limit'''
+
+        with self.lock:
+            key = (server, zoom, x, y)
+            # A tile stored again replaces its row, so only the change in its length goes into the size
+            added = self.connection.execute('INSERT OR IGNORE INTO tiles VALUES (?, ?, ?, ?, ?, ?)', (*key, data, time.time())).rowcount
+            if added:
+                self.size += len(data)
+            else:
+                old = self.connection.execute('SELECT LENGTH(tile_data) FROM tiles WHERE server = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                              key).fetchone()[0]
+                self.connection.execute('UPDATE tiles SET tile_data = ?, last_used = ? WHERE server = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                        (data, time.time(), *key))
+                self.size += len(data) - (old or 0)
+            self.flush()
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def flush(self):
+
+        '''Writes pending use times and counts and commits; the lock must be held'''
+
+        self.connection.executemany('UPDATE tiles SET last_used = ? WHERE server = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                    [(used, *key) for key, used in self.touched.items()])
+        self.connection.executemany('INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                                    list(self.pending.items()))
+        self.touched.clear()
+        self.pending.clear()
+        self.connection.commit()
+
+    def sync(self):
+        '''Writes pending use times and counts; runs at exit for the shared cache'''
+        with self.lock:
+            self.flush()
+
+    def evict(self):
+
+        '''Deletes the least recently used tiles until the cache is under 90 percent of max_bytes; the lock must be held'''
+
+        excess = self.size - int(self.max_bytes * 0.9)
+        rows = self.connection.execute('SELECT rowid, LENGTH(tile_data) FROM tiles ORDER BY last_used').fetchall()
+        doomed = []
+        for rowid, size in rows:
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+        self.connection.executemany('DELETE FROM tiles WHERE rowid = ?', doomed)
+        self.connection.commit()
+        self.size = self.connection.execute('SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM tiles').fetchone()[0]
+
+    def download(self, server, zoom, x, y):
+
+        '''Requests a tile image from the tile server; returns None if it can't be reached'''
+
+        url = server.replace('{x}', str(x)).replace('{y}', str(y)).replace('{z}', str(zoom))
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': 'TkinterMapView'}), timeout=self.timeout) as response:
+                return(response.read())
+        except OSError:
+            with self.lock:
+                self.errors += 1
+                self.pending['errors'] += 1
+            return(None)
+
+    def tile(self, server, zoom, x, y):
+
+        '''Returns a tile image from the cache, downloading and storing it on a miss \n
+        Returns None when the tile isn't cached and the server can't be reached'''
+
+        data = self.get(server, zoom, x, y)
+        if data is None:
+            data = self.download(server, zoom, x, y)
+            if data is not None:
+                self.put(server, zoom, x, y, data)
+        return(data)
+
+    def prefetch(self, server, tiles, max_in_flight: int = 4, on_progress=None):
+
+        '''Downloads every (zoom, x, y) tile in tiles that isn't cached yet \n
+        on_progress(done, total) is called as tiles finish; returns the number of tiles that couldn't be downloaded'''
+
+        missing = self.missing(server, tiles)
+        failed = 0
+
+        def fetch(tile):
+            data = self.download(server, *tile)
+            if data is not None:
+                self.put(server, *tile, data)
+            return(data is not None)
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            for done, stored in enumerate(pool.map(fetch, missing), 1):
+                failed += not stored
+                if on_progress is not None:
+                    on_progress(done, len(missing))
+        return(failed)
+
+    def missing(self, server, tiles):
+        '''Returns the (zoom, x, y) tiles in tiles that aren't cached for a server'''
+        with self.lock:
+            cached = {tuple(row) for row in self.connection.execute('SELECT zoom_level, tile_column, tile_row FROM tiles WHERE server = ?', (server,))}
+        return([tile for tile in tiles if tile not in cached])
+
+    def stats(self):
+
+        '''Returns the hit, miss and download error counts since the cache file was created, the hit rate and the size in bytes'''
+
+        with self.lock:
+            totals = Counter(dict(self.connection.execute('SELECT name, value FROM counters').fetchall()))
+            totals.update(self.pending)
+            lookups = totals['hits'] + totals['misses']
+            return({'hits': totals['hits'], 'misses': totals['misses'], 'errors': totals['errors'],
+                    'hit_rate': round(totals['hits'] / lookups, 3) if lookups else 0.0, 'bytes': self.size})
+
+def tiles_in_bbox(south, west, north, east, min_zoom, max_zoom):
+
+    '''Returns the (zoom, x, y) numbers of every map tile covering a bounding box from min_zoom through max_zoom'''
+
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        last = 2 ** zoom - 1
+        left, top = mercator_pixels(north, west, zoom)
+        right, bottom = mercator_pixels(south, east, zoom)
+        for x in range(max(int(left // 256), 0), min(int(right // 256), last) + 1):
+            for y in range(max(int(top // 256), 0), min(int(bottom // 256), last) + 1):
+                tiles.append((zoom, x, y))
+    return(tiles)
+
+tile_cache = None
+tile_cache_lock = threading.Lock()
+
+def get_tile_cache():
+
+    '''Returns the process-wide map tile cache, opening the cache file on first use'''
+
+    global tile_cache
+
+    if tile_cache is None:
+        with tile_cache_lock:
+            if tile_cache is None:
+                tile_cache = TileCache()
+                # Counts from the last few lookups would otherwise be lost when the app closes
+                atexit.register(tile_cache.sync)
+    return(tile_cache)
+
+def fixture_key(location, day):
+    '''Returns the key a recorded visit list is stored under in a fixture'''
+    return(f"{location}|{day.strftime('%Y-%m-%d')}")
+
+class RecordingApi():
+
+    '''Wraps an eBird api module and keeps every taxonomy, hotspot list, visit list and checklist it returns \n
+    The recording can be saved as a fixture and replayed offline with FixtureApi'''
+
+    def __init__(self, api=None):
+
+        self.api = api if api is not None else get_ebird_client()
+        self.taxonomy = None
+        self.hotspots = {}
+        self.visits = {}
+        self.checklists = {}
+        self.lock = threading.Lock()
+
+    def get_taxonomy(self, api_key):
+        taxonomy = self.api.get_taxonomy(api_key)
+        with self.lock:
+            self.taxonomy = {taxa.get('speciesCode'): taxa.get('comName') for taxa in taxonomy}
+        return(taxonomy)
+
+    def get_hotspots(self, api_key, region, back=None):
+        hotspots = self.api.get_hotspots(api_key, region, back)
+        with self.lock:
+            self.hotspots[region] = hotspots
+        return(hotspots)
+
+    def get_visits(self, api_key, location, date=None, max_results=100):
+        visits = self.api.get_visits(api_key, location, date=date, max_results=max_results)
+        with self.lock:
+            self.visits[fixture_key(location, date)] = visits
+        return(visits)
+
+    def get_checklist(self, api_key, sub_id):
+        checklist = self.api.get_checklist(api_key, sub_id)
+        with self.lock:
+            self.checklists[sub_id] = checklist
+        return(checklist)
+
+    def fixture(self, clear: bool = False):
+        '''Returns the recorded responses in fixture form, optionally starting a new recording'''
+        with self.lock:
+            fixture = {'hotspots': dict(self.hotspots), 'visits': dict(self.visits), 'checklists': dict(self.checklists)}
+            if self.taxonomy is not None:
+                fixture['taxonomy'] = self.taxonomy
+            if clear:
+                self.taxonomy = None
+                self.hotspots.clear()
+                self.visits.clear()
+                self.checklists.clear()
+        return(fixture)
+
+class FixtureApi():
+
+    '''Stands in for the eBird api module using responses recorded by RecordingApi \n
+    Unrecorded lists are empty and unrecorded checklists come back as None, so no request leaves the machine'''
+
+    def __init__(self, fixture=None):
+
+        fixture = fixture if fixture is not None else {}
+        self.hotspots = fixture.get('hotspots', {})
+        self.visits = fixture.get('visits', {})
+        self.checklists = fixture.get('checklists', {})
+        # The time the fixture was recorded at; replays measure days_back from it
+        self.recorded_at = fixture.get('recorded_at')
+        self.taxonomy = fixture.get('taxonomy')
+
+    @classmethod
+    def load(cls, path):
+        '''Loads a fixture file'''
+        with open(path, 'r') as f:
+            return(cls(json.load(f)))
+
+    def get_taxonomy(self, api_key):
+        return([{'speciesCode': code, 'comName': name} for code, name in (self.taxonomy or {}).items()])
+
+    def get_hotspots(self, api_key, region, back=None):
+        return(self.hotspots.get(region, []))
+
+    def get_visits(self, api_key, location, date=None, max_results=100):
+        return(self.visits.get(fixture_key(location, date), [])[:max_results])
+
+    def get_checklist(self, api_key, sub_id):
+        return(self.checklists.get(sub_id))
+
+class ChecklistFetcher():
+
+    '''Fetches visit lists and checklists for a location using a bounded pool of worker threads \n
+    Checklist requests are submitted as soon as each day's visit list arrives'''
+
+    # The most visits eBird returns in one list; a full list may have left out later checklists
+    max_visits = 200
+
+    def __init__(self, api_key, max_in_flight: int = 8, retries: int = 3, backoff: float = 0.5, api=None, cache=None,
+                 offline: bool = False):
+
+        self.api_key = api_key
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        # Defaults to the shared eBird client; can be swapped for a local stub exposing get_visits and get_checklist
+        self.api = api if api is not None else get_ebird_client()
+        # Falls back to the shared checklist cache when the first fetch runs
+        self.cache = cache
+        # Offline fetchers reuse expired visit lists; pair them with a FixtureApi so nothing reaches the network
+        self.offline = offline
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+        # (location, 'YYYY-MM-DD') of every visit list that came back full
+        self.truncated = set()
+
+    def request(self, func, *args, **kwargs):
+
+        '''Calls an eBird api function, retrying failed requests with exponential backoff'''
+
+        for attempt in range(self.retries + 1):
+            with self.count_lock:
+                self.request_count += 1
+            if attempt:
+                profiler.count('ebird.retries')
+            try:
+                return(func(*args, **kwargs))
+            except urllib.error.HTTPError as e:
+                # Client errors other than throttling will fail the same way on every attempt
+                if (e.code < 500 and e.code != 429) or attempt == self.retries:
+                    raise
+            except OSError:
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * (2 ** attempt))
+
+    def fetch_visits(self, location, day):
+
+        '''Returns a location's visit list for a day, using the cached list when it is still fresh \n
+        Lists that reach max_visits are recorded in truncated, since eBird may have cut them off'''
+
+        visits = self.cache.get_visits(location, day, stale=self.offline)
+        if visits is None:
+            visits = self.request(self.api.get_visits, self.api_key, location, date=day, max_results=self.max_visits)
+            # An offline api answers unrecorded lists with [], which would hide the real list from online fetchers sharing the cache
+            if not self.offline:
+                self.cache.put_visits(location, day, visits)
+
+        if len(visits) >= self.max_visits:
+            profiler.count('visits.truncated')
+            with self.count_lock:
+                self.truncated.add((location, day.strftime('%Y-%m-%d')))
+        return(visits)
+
+    def fetch(self, location, current_time, days_back, skip=(), on_checklist=None, cancel=None):
+
+        '''Returns the checklists for every visit to a location over the past days_back days \n
+        Checklists are ordered by day and then by visit, matching a sequential fetch \n
+        Any subIds in skip are left out without being fetched \n
+        on_checklist(checklist, loaded, total) is called from this thread as each checklist arrives; total grows as visit lists arrive \n
+        Setting the cancel event stops queued requests and returns the checklists loaded so far'''
+
+        return(self.fetch_many([(location, d) for d in range(0, days_back)], current_time, skip, on_checklist, cancel))
+
+    def fetch_many(self, visits, current_time, skip=(), on_checklist=None, cancel=None):
+
+        '''Returns the checklists for a list of (location, days before current_time) visit lists in one shared pool \n
+        A checklist listed under several locations is fetched and returned once \n
+        Checklists are ordered by day, then by position in visits, then by visit; the other arguments work as in fetch'''
+
+        visit_order = {}
+        checklists = {}
+
+        if self.cache is None:
+            self.cache = get_checklist_cache()
+
+        def deliver(code, checklist):
+            checklists[code] = checklist
+            if on_checklist is not None:
+                on_checklist(checklist, len(checklists), len(visit_order))
+
+        def cancelled():
+            return(cancel is not None and cancel.is_set())
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            visit_futures = {
+                pool.submit(self.fetch_visits, location, current_time - datetime.timedelta(d)): (d, n)
+                for n, (location, d) in enumerate(visits)
+                }
+            checklist_futures = {}
+
+            try:
+                # Queue each checklist as soon as its visit list comes back instead of waiting on every day
+                for future in as_completed(visit_futures):
+                    if cancelled():
+                        break
+                    d, n = visit_futures[future]
+
+                    for i, v in enumerate(future.result()):
+                        code = v.get('subId')
+                        if code in visit_order or code in skip:
+                            continue
+                        visit_order[code] = (d, n, i)
+
+                        # Only checklists that haven't been seen before go out to the network
+                        cached = self.cache.get(code)
+                        if cached is not None:
+                            deliver(code, cached)
+                        else:
+                            checklist_futures[pool.submit(self.request, self.api.get_checklist, self.api_key, code)] = code
+
+                if not cancelled():
+                    for future in as_completed(checklist_futures):
+                        if cancelled():
+                            break
+                        code = checklist_futures[future]
+                        # Only an offline api can come back empty-handed; the checklist is left out rather than cached
+                        if future.result() is None:
+                            continue
+                        self.cache.put(code, future.result())
+                        deliver(code, future.result())
+            except BaseException:
+                # A failed request surfaces at once instead of after every queued request and its retries
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+            # Drops requests that haven't started; the pool still waits on the ones in flight
+            if cancelled():
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        return([checklists[code] for code in sorted(checklists, key=visit_order.get)])
+
+class HotspotPrefetcher():
+
+    '''Low priority background thread that warms the checklist cache for hotspots in the map view \n
+    Hotspots are warmed nearest and most recently active first, within a request budget per budget_window seconds \n
+    pause() stops the current prefetch at once so user-initiated loads get the network to themselves'''
+
+    def __init__(self, api_key, budget: int = 600, budget_window: int = 3600, max_in_flight: int = 2, days_back: int = 14, api=None):
+
+        self.fetcher = ChecklistFetcher(api_key, max_in_flight=max_in_flight, api=api)
+        self.budget = budget
+        self.budget_window = budget_window
+        self.days_back = days_back
+        self.window_start = time.monotonic()
+        self.window_base = 0
+
+        self.targets = []
+        # locId -> time of the last completed warm-up
+        self.warmed = {}
+        self.condition = threading.Condition()
+        # Cleared while a user-initiated load is running
+        self.idle = threading.Event()
+        self.idle.set()
+        self.cancel = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        '''Starts the prefetch thread'''
+        self.thread.start()
+
+    def set_targets(self, hotspots, center):
+
+        '''Replaces the hotspots waiting to be warmed \n
+        Hotspots are ordered by distance from center, where each day since a hotspot's latest observation counts as extra distance'''
+
+        now = datetime.datetime.now()
+
+        # A hotspot last active days_back days ago is treated as twice as far away as its true distance
+        def priority(spot):
+            distance = distance_km(center[0], center[1], spot.get('lat'), spot.get('lng'))
+            latest = datetime.datetime.strptime(spot.get('latestObsDt', '1970-1-1 0:00'), '%Y-%m-%d %H:%M')
+            age_days = max(0, (now - latest).total_seconds() / 86400)
+            return(distance * (1 + age_days / self.days_back))
+
+        with self.condition:
+            self.targets = sorted(hotspots, key=priority)
+            self.condition.notify()
+
+    def pause(self):
+        '''Cancels the running prefetch and holds off new ones until resume is called'''
+        self.idle.clear()
+        self.cancel.set()
+
+    def resume(self):
+        '''Lets prefetching continue after a user-initiated load finishes'''
+        self.idle.set()
+
+    def budget_left(self):
+
+        '''Returns the number of requests left in the current budget window'''
+
+        if time.monotonic() - self.window_start >= self.budget_window:
+            self.window_start = time.monotonic()
+            self.window_base = self.fetcher.request_count
+        return(self.budget - (self.fetcher.request_count - self.window_base))
+
+    def run(self):
+
+        '''Warms target hotspots one at a time until the thread is stopped with the process'''
+
+        while True:
+            with self.condition:
+                while not self.targets:
+                    self.condition.wait()
+                spot = self.targets.pop(0)
+
+            self.idle.wait()
+            id = spot.get('locId')
+
+            # Warmed hotspots stay warm for as long as their visit lists are cached
+            if self.fetcher.cache is None:
+                self.fetcher.cache = get_checklist_cache()
+            if time.monotonic() - self.warmed.get(id, -math.inf) < self.fetcher.cache.visit_ttl:
+                continue
+
+            if self.budget_left() <= 0:
+                with self.condition:
+                    self.targets.insert(0, spot)
+                time.sleep(self.budget_window - (time.monotonic() - self.window_start))
+                continue
+
+            # pause() clears idle before setting cancel, so one of the two is always seen here
+            cancel = threading.Event()
+            self.cancel = cancel
+            if not self.idle.is_set():
+                cancel.set()
+
+            def check_budget(checklist, loaded, total):
+                if self.budget_left() <= 0:
+                    cancel.set()
+
+            try:
+                self.fetcher.fetch(id, datetime.datetime.now(), self.days_back, on_checklist=check_budget, cancel=cancel)
+            except OSError:
+                # Network errors only cost this hotspot its warm-up
+                continue
+            except Exception:
+                # Bad responses and cache errors are logged but can't be allowed to end the thread
+                traceback.print_exc()
+                continue
+
+            if cancel.is_set():
+                # Picks the hotspot back up after the user's load unless the view has moved on
+                with self.condition:
+                    if spot not in self.targets:
+                        self.targets.insert(0, spot)
+            else:
+                self.warmed[id] = time.monotonic()
+
+class BirdDataHandler():
+
+    def __init__(self, api_key, location, days_back: int = 14, fetcher=None, incremental: bool = False, use_numpy=None):
+
+        self.api_key = api_key
+        self.fetcher = fetcher if fetcher is not None else ChecklistFetcher(api_key)
+        # Set to the shared taxonomy index on the first call to sort_observations
+        self.taxonomy = None
+        self.current_time = datetime.datetime.now()
+        self.location = location
+        self.days_back = days_back
+        self.bird_dict = {}
+        # None uses NumPy for full recomputes when it is installed
+        self.use_numpy = use_numpy
+
+        # Running state for incremental mode; aggregates keep time_since in seconds before reference_time
+        self.incremental = incremental
+        self.reference_time = self.current_time
+        self.aggregates = {}
+        self.folded = {}
+        self.checklist_days = []
+
+    def gather_checklists(self, skip=(), on_checklist=None, cancel=None):
+
+        '''Gathers checklist codes from visits to a location within 14 days'''
+
+        if self.days_back > 14:
+            return []
+
+        with profiler.span('gather_checklists'):
+            return(self.fetcher.fetch(self.location, self.current_time, self.days_back, skip, on_checklist, cancel))
+    
+    def sort_observations(self, on_progress=None, cancel=None):
+
+        '''Gathers observation data from checklists and formats it into ObservationData objects \n
+        Returns a dictionary of formatted observations sorted alphabetically by common name \n
+        In incremental mode, on_progress(loaded, total) is called after each checklist is folded in and cancel stops the fetch early'''
+
+        self.taxonomy = get_taxonomy_index()
+
+        if self.incremental:
+            return(self.update_observations(on_progress, cancel))
+
+        # Clear bird dict if the method has already been called in an instance
+        if self.bird_dict:
+            self.bird_dict = {}
+
+        checklists = self.gather_checklists()
+
+        # Get the time since as a number of seconds; enchances precision of observation updates
+        with profiler.span('aggregate_checklists'):
+            bird_dict = aggregate_checklists(checklists, self.current_time, self.taxonomy, self.use_numpy)
+        if bird_dict is None:
+            return []
+        self.bird_dict = bird_dict
+
+        # Converts the time_since attribute back to days; seconds are initially used for accurate sight comparisons
+        for t in self.bird_dict.values():
+            t.time_since = int(t.time_since // 86400)
+            
+        # Format observations alphabetically by ObservationData class common name attribute
+        self.bird_dict = dict(sorted(self.bird_dict.items(), key=lambda item: item[1].common_name))
+        return(self.bird_dict)
+
+    def update_observations(self, on_progress=None, cancel=None):
+
+        '''Folds only checklists that haven't been seen before into the running aggregates \n
+        Checklists that fall outside days_back are aged out without rescanning the rest \n
+        Returns a dictionary of formatted observations sorted alphabetically by common name'''
+
+        self.current_time = datetime.datetime.now()
+        cutoff_day = (self.current_time - datetime.timedelta(self.days_back - 1)).date()
+
+        # Checklists are popped oldest first, so only the expired ones are ever touched
+        while self.checklist_days and self.checklist_days[0][0] < cutoff_day:
+            day, sub_id = heapq.heappop(self.checklist_days)
+
+            for obs_code in self.folded.pop(sub_id):
+                aggregate = self.aggregates[obs_code]
+                aggregate.checklist_count -= 1
+                # A species' latest sighting is never older than its others, so it leaves once every sighting has
+                if aggregate.checklist_count == 0:
+                    del self.aggregates[obs_code]
+
+        # Checklists are folded in as they arrive so partial results can be shown while the rest load
+        def fold_checklist(data, loaded, total):
+            with profiler.span('fold_checklist'):
+                self.fold_checklist(data)
+            if on_progress is not None:
+                on_progress(loaded, total)
+
+        self.gather_checklists(skip=self.folded, on_checklist=fold_checklist, cancel=cancel)
+        return(self.snapshot())
+
+    def fold_checklist(self, data):
+
+        '''Merges one checklist's observations into the running aggregates'''
+
+        sub_id = data.get('subId')
+        observations = data.get('obs')
+        species = []
+        day = self.current_time.date()
+
+        for obs in observations:
+            obs_code = obs.get('speciesCode')
+            obs_date = parse_obs_dt(obs.get('obsDt'))
+            obs_timesince = int((self.reference_time - obs_date).total_seconds())
+            obs_count = parse_count(obs.get('howManyStr'))
+            day = obs_date.date()
+
+            if obs_code in self.aggregates:
+                self.aggregates.get(obs_code).update_observation(new_time=obs_timesince, new_count=obs_count)
+            elif obs_code in self.taxonomy:
+                self.aggregates[obs_code] = ObservationData(obs_code, self.taxonomy[obs_code], obs_count, obs_timesince, 1)
+            else:
+                # Unlike a full recompute, one unknown species can't discard the aggregates already built
+                continue
+            species.append(obs_code)
+
+        self.folded[sub_id] = species
+        heapq.heappush(self.checklist_days, (day, sub_id))
+
+    def snapshot(self):
+
+        '''Formats the running aggregates into bird_dict and returns it \n
+        Must be called from the thread running sort_observations while a fetch is in progress'''
+
+        # Shifts the stored seconds onto the current time and converts them to days for display
+        elapsed = (self.current_time - self.reference_time).total_seconds()
+        self.bird_dict = {
+            code: replace(data, time_since=int((data.time_since + elapsed) // 86400))
+            for code, data in sorted(self.aggregates.items(), key=lambda item: item[1].common_name)
+            }
+        return(self.bird_dict)
+
+class AreaDataHandler():
+
+    '''Aggregates observations from many hotspots or whole eBird regions into one species table \n
+    Locations are hotspot IDs or region codes such as US-VA-003; a checklist listed under several of them is fetched and counted once'''
+
+    # Checklists submitted this many days after the visit are still found
+    late_days = 7
+
+    def __init__(self, api_key, locations, days_back: int = 14, fetcher=None, use_numpy=None, latest=None, refreshed=None):
+
+        self.api_key = api_key
+        # Every location's visit lists and checklists share one pool, but every request still waits on the shared rate limit
+        # Uncached, each location costs up to days_back visit requests, so wall time grows with the location count
+        self.fetcher = fetcher if fetcher is not None else ChecklistFetcher(api_key, max_in_flight=16)
+        self.taxonomy = None
+        self.current_time = datetime.datetime.now()
+        self.locations = list(dict.fromkeys(locations))
+        self.days_back = days_back
+        self.use_numpy = use_numpy
+        self.bird_dict = {}
+
+        # Latest observation time per hotspot as of the hotspot cache's refresh time; lets quiet days be skipped
+        self.latest = latest if latest is not None else {}
+        self.refreshed = refreshed
+        # Visit lists from the last gather that came back full, as (location, 'YYYY-MM-DD'); their totals may be short
+        self.truncated = []
+
+    @classmethod
+    def from_hotspots(cls, api_key, spots, refreshed=None, **kwargs):
+
+        '''Builds a handler for hotspot dictionaries taken from the hotspot cache \n
+        refreshed is the time the cache was last refreshed; without it every day is fetched for every hotspot'''
+
+        latest = {spot['locId']: parse_obs_dt(spot['latestObsDt']) for spot in spots if spot.get('latestObsDt')}
+        return(cls(api_key, [spot['locId'] for spot in spots], latest=latest, refreshed=refreshed, **kwargs))
+
+    @classmethod
+    def in_bbox(cls, api_key, hotspots, south, west, north, east, **kwargs):
+
+        '''Builds a handler for every cached hotspot inside a bounding box \n
+        hotspots can be the hotspot cache or a HotspotGrid already built over it'''
+
+        index = hotspots if isinstance(hotspots, HotspotGrid) else HotspotGrid(hotspots)
+        spots = index.query(south, west, north, east)
+        return(cls.from_hotspots(api_key, spots, getattr(index.hotspots, 'refreshed', None), **kwargs))
+
+    @classmethod
+    def near(cls, api_key, hotspots, lat, lng, radius_km, **kwargs):
+
+        '''Builds a handler for every cached hotspot within radius_km of a coordinate'''
+
+        index = hotspots if isinstance(hotspots, HotspotGrid) else HotspotGrid(hotspots)
+        # Narrows the search to the enclosing box before measuring distances
+        lat_span = radius_km / 111.2
+        lng_span = radius_km / (111.2 * max(math.cos(math.radians(lat)), 0.01))
+        spots = [spot for spot in index.query(lat - lat_span, lng - lng_span, lat + lat_span, lng + lng_span)
+                 if distance_km(lat, lng, spot['lat'], spot['lng']) <= radius_km]
+        return(cls.from_hotspots(api_key, spots, getattr(index.hotspots, 'refreshed', None), **kwargs))
+
+    def visit_days(self, location):
+
+        '''Returns the days before current_time that can have visits to a location \n
+        Days after a hotspot's latest observation are only skipped once they are late_days before the cache refresh; \n
+        checklists can be submitted days after the visit, so a quiet hotspot may still gain visits on recent days'''
+
+        days = range(0, self.days_back)
+        latest = self.latest.get(location)
+        if latest is None or self.refreshed is None:
+            return(days)
+
+        today = self.current_time.date()
+        settled = self.refreshed.date() - datetime.timedelta(self.late_days)
+        return([d for d in days if not latest.date() < today - datetime.timedelta(d) < settled])
+
+    def gather_checklists(self, on_checklist=None, cancel=None):
+
+        '''Gathers the checklists from visits to every location within days_back days'''
+
+        visits = [(location, d) for location in self.locations for d in self.visit_days(location)]
+        checklists = self.fetcher.fetch_many(visits, self.current_time, on_checklist=on_checklist, cancel=cancel)
+
+        requested = {(location, (self.current_time - datetime.timedelta(d)).strftime('%Y-%m-%d')) for location, d in visits}
+        self.truncated = sorted(requested & self.fetcher.truncated)
+        return(checklists)
+
+    def sort_observations(self, on_progress=None, cancel=None):
+
+        '''Gathers observation data from every location and merges it into one set of ObservationData objects \n
+        Returns a dictionary of formatted observations sorted alphabetically by common name \n
+        on_progress(loaded, total) is called as checklists arrive and cancel stops the fetch early'''
+
+        self.taxonomy = get_taxonomy_index()
+        self.current_time = datetime.datetime.now()
+
+        on_checklist = None
+        if on_progress is not None:
+            on_checklist = lambda checklist, loaded, total: on_progress(loaded, total)
+        checklists = self.gather_checklists(on_checklist, cancel)
+
+        # A species missing from the taxonomy only drops out itself; across an area, one would otherwise blank the whole table
+        self.bird_dict = aggregate_checklists(checklists, self.current_time, self.taxonomy, self.use_numpy, strict=False)
+        for t in self.bird_dict.values():
+            t.time_since = int(t.time_since // 86400)
+
+        self.bird_dict = dict(sorted(self.bird_dict.items(), key=lambda item: item[1].common_name))
+        return(self.bird_dict)
+
+class Job():
+
+    '''A unit of work run by a JobScheduler \n
+    The running function checks cancelled() to stop early and hands results to the main loop with post'''
+
+    def __init__(self, scheduler, key, func, args):
+
+        self.scheduler = scheduler
+        self.key = key
+        self.func = func
+        self.args = args
+        self.cancel_event = threading.Event()
+        # Superseded jobs are cancelled and their posted results are dropped; plain cancels still deliver them
+        self.superseded = False
+        self.done = threading.Event()
+        self.error = None
+        self.submitted = time.monotonic()
+
+    def cancel(self):
+        '''Asks the job to stop; results it has already posted are still delivered'''
+        self.cancel_event.set()
+
+    def cancelled(self):
+        return(self.cancel_event.is_set())
+
+    def post(self, callback, *args):
+        '''Queues callback(*args) to run on the main loop unless the job is superseded first'''
+        self.scheduler.post(callback, *args, job=self)
+
+class JobScheduler():
+
+    '''Runs jobs on a bounded pool of worker threads and passes their results to a main loop through one queue \n
+    Submitting a job under a key supersedes the job holding that key, so the latest request wins \n
+    The new job starts once the superseded one has stopped, so the two never share state at the same time'''
+
+    def __init__(self, max_workers: int = 4):
+
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='birdtool-job')
+        # Filled from any thread and emptied on the main loop by drain
+        self.channel = queue.SimpleQueue()
+        self.current = {}
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.counts = Counter()
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def submit(self, key, func, *args):
+
+        '''Schedules func(job, *args) and returns its Job; a key of None never supersedes anything'''
+
+        job = Job(self, key, func, args)
+        with self.lock:
+            previous = self.current.get(key) if key is not None else None
+            if previous is not None:
+                previous.superseded = True
+                previous.cancel()
+                self.counts['superseded'] += 1
+            if key is not None:
+                self.current[key] = job
+            self.queued += 1
+            self.counts['submitted'] += 1
+        self.pool.submit(self.run, job, previous)
+        return(job)
+
+    def run(self, job, previous):
+
+        '''Runs a job on a worker thread once the job it superseded has stopped'''
+
+        if previous is not None:
+            previous.done.wait()
+        started = time.monotonic()
+        with self.lock:
+            self.queued -= 1
+            self.wait_seconds += started - job.submitted
+
+        try:
+            # A job superseded before it started has nobody left to deliver to
+            if not job.superseded:
+                job.func(job, *job.args)
+        except Exception as e:
+            job.error = e
+            with self.lock:
+                self.counts['failed'] += 1
+            traceback.print_exc()
+        finally:
+            elapsed = time.monotonic() - started
+            with self.lock:
+                self.counts['finished'] += 1
+                self.run_seconds += elapsed
+                self.max_run_seconds = max(self.max_run_seconds, elapsed)
+                if self.current.get(job.key) is job:
+                    del self.current[job.key]
+            job.done.set()
+
+    def supersede(self, key):
+
+        '''Supersedes the job holding a key without starting a new one'''
+
+        with self.lock:
+            job = self.current.pop(key, None)
+            if job is not None:
+                job.superseded = True
+                job.cancel()
+                self.counts['superseded'] += 1
+
+    def cancel(self, key):
+        '''Cancels the job holding a key, if there is one'''
+        with self.lock:
+            job = self.current.get(key)
+        if job is not None:
+            job.cancel()
+
+    def post(self, callback, *args, job=None):
+        '''Queues callback(*args) for the main loop; safe to call from any thread'''
+        self.channel.put((job, callback, args))
+
+    def drain(self, budget: float = 0.01):
+
+        '''Runs queued callbacks on the calling thread for up to budget seconds \n
+        Must be called regularly from the main loop; callbacks from superseded jobs are skipped'''
+
+        deadline = time.monotonic() + budget
+        while time.monotonic() < deadline:
+            try:
+                job, callback, args = self.channel.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job.superseded:
+                continue
+            callback(*args)
+
+    def shutdown(self):
+        '''Cancels every job and stops the pool without waiting for running jobs'''
+        with self.lock:
+            jobs = list(self.current.values())
+        for job in jobs:
+            job.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self):
+
+        '''Returns queue depths, job counts and mean wait and mean/max run times in milliseconds'''
+
+        with self.lock:
+            started = self.counts['submitted'] - self.queued
+            finished = self.counts['finished']
+            return({'queued': self.queued,
+                    'channel': self.channel.qsize(),
+                    'running': started - finished,
+                    'submitted': self.counts['submitted'],
+                    'superseded': self.counts['superseded'],
+                    'failed': self.counts['failed'],
+                    'mean_wait_ms': round(self.wait_seconds / started * 1000, 1) if started else 0.0,
+                    'mean_run_ms': round(self.run_seconds / finished * 1000, 1) if finished else 0.0,
+                    'max_run_ms': round(self.max_run_seconds * 1000, 1)
+                    })